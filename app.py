@@ -1,44 +1,129 @@
 import os
+import weakref
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from extensions import db, login_manager
-from flask_sqlalchemy import SQLAlchemy
 
+# apps built in this process, for the single fork hook below; held weakly so
+# an app that is no longer used is neither kept alive nor disposed in children
+_apps = weakref.WeakSet()
 
-app = Flask(__name__)
-app.secret_key = os.environ.get("SESSION_SECRET") or "dev-secret-key-change-in-production"
-app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL") or "sqlite:///local.db"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
-db.init_app(app)
-login_manager.init_app(app)
-login_manager.login_view = "auth.login"
-login_manager.login_message = "Please log in to access this page."
-login_manager.login_message_category = "info"
+def create_app(config=None):
+    # builds the app without touching the database, so importing it in a
+    # gunicorn master (--preload) or a CLI opens no connections
+    app = Flask(__name__)
+    app.secret_key = os.environ.get("SESSION_SECRET") or "dev-secret-key-change-in-production"
+    app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL") or "sqlite:///local.db"
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    if os.environ.get("DATABASE_REPLICA_URL"):
+        app.config["SQLALCHEMY_BINDS"] = {"replica": os.environ["DATABASE_REPLICA_URL"]}
+    app.config["READ_YOUR_WRITES_SECONDS"] = int(os.environ.get("READ_YOUR_WRITES_SECONDS") or 10)
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["STATS_USE_COUNTERS"] = os.environ.get("STATS_USE_COUNTERS") == "1"
+    app.config["SLOW_REQUEST_MS"] = int(os.environ.get("SLOW_REQUEST_MS") or 500)
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")
+    app.config["PUBLIC_PAGE_MAX_AGE"] = int(os.environ.get("PUBLIC_PAGE_MAX_AGE") or 60)
+    app.config["SLOTS_MAX_AGE"] = int(os.environ.get("SLOTS_MAX_AGE") or 10)
+    app.config["AVAILABILITY_USE_BITMAPS"] = os.environ.get("AVAILABILITY_USE_BITMAPS", "1") == "1"
+    app.config["AVAILABILITY_API_URL"] = (os.environ.get("AVAILABILITY_API_URL") or "").rstrip("/")
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD") or "scrypt"
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS") or 0)
+    app.config["LOGIN_ATTEMPTS_PER_IP"] = int(os.environ.get("LOGIN_ATTEMPTS_PER_IP") or 20)
+    app.config["LOGIN_ATTEMPTS_PER_EMAIL"] = int(os.environ.get("LOGIN_ATTEMPTS_PER_EMAIL") or 5)
+    app.config["REGISTER_ATTEMPTS_PER_IP"] = int(os.environ.get("REGISTER_ATTEMPTS_PER_IP") or 20)
+    app.config["REGISTER_ATTEMPTS_PER_EMAIL"] = int(os.environ.get("REGISTER_ATTEMPTS_PER_EMAIL") or 5)
+    app.config["PROXY_TRUSTED_HOPS"] = int(os.environ.get("PROXY_TRUSTED_HOPS") or 0)
+    app.config.update(config or {})
+    if app.config["PROXY_TRUSTED_HOPS"]:
+        # the login/sign-up limiters key on request.remote_addr, which behind a proxy
+        # is the proxy's own address unless the hops it appends to X-Forwarded-For are trusted
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["PROXY_TRUSTED_HOPS"])
 
-@login_manager.user_loader
-def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    db.init_app(app)
+    login_manager.init_app(app)
+    login_manager.login_view = "auth.login"
+    login_manager.login_message = "Please log in to access this page."
+    login_manager.login_message_category = "info"
 
-with app.app_context():
     import models
-    db.create_all()
-    
+    import stats
+    import bulk
+    import availability
+    import tenants
+    import principals
+    import passwords
+    import throttle
+    import replicas
+    import httpcache
+    import fragments
+    import jobs
+    import bitmaps
+    import rollups
+    import instrumentation
+    import migrations
+    migrations.init_app(app)
+    stats.init_app(app)
+    bulk.init_app(app)
+    httpcache.init_app(app)
+    fragments.init_app(app)
+    jobs.init_app(app)
+    bitmaps.init_app(app)
+    rollups.init_app(app)
+    passwords.init_app(app)
+    throttle.init_app(app)
+    replicas.init_app(app)
+    instrumentation.init_app(app)
+    instrumentation.metrics.register_cache("availability", availability.availability_cache)
+    instrumentation.metrics.register_cache("tenant", tenants.tenant_cache)
+    instrumentation.metrics.register_cache("fragments", fragments.fragment_cache)
+    instrumentation.metrics.register_cache("principal", principals.principal_cache)
+
     from routes.auth import auth_bp
     from routes.dashboard import dashboard_bp
     from routes.booking import booking_bp
     from routes.admin import admin_bp
     from routes.main import main_bp
-    
+
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp, url_prefix="/auth")
     app.register_blueprint(dashboard_bp, url_prefix="/dashboard")
     app.register_blueprint(booking_bp, url_prefix="/b")
     app.register_blueprint(admin_bp, url_prefix="/admin")
 
+    _apps.add(app)
+    return app
+
+
+def dispose_engines(app):
+    # a forked child must not reuse pooled connections opened by its parent;
+    # close=False leaves them open for the parent instead of closing them here
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def _dispose_after_fork():
+    for app in list(_apps):
+        dispose_engines(app)
+
+
+os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
+@login_manager.user_loader
+def load_user(user_id):
+    from principals import load_principal
+    return load_principal(int(user_id))
+
+
+app = create_app()
+
 if __name__ == "__main__":
+    import migrations
+    with app.app_context():
+        migrations.upgrade()
     app.run(debug=True)
@@ -0,0 +1,208 @@
+import json
+import os
+import re
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs
+from sqlalchemy import and_, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from models import Business, Service, WorkingHour, Booking
+from availability import (
+    MAX_RANGE_DAYS, availability_cache, busy_intervals_by_date, busy_rows_statement, day_slots, to_minutes,
+    visible_slots, working_hour_statement
+)
+from bitmaps import bitmaps_by_date_statement, day_bitmap_statement, decode, decode_by_date, supports_bitmap
+from httpcache import slot_clock
+
+# Async read-only slot API. Serves the same JSON as /b/<slug>/slots and
+# /b/<slug>/availability so a proxy can route those paths here:
+#   uvicorn asgi:app --workers 2
+# or: gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "postgres": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+ROUTE = re.compile(r"^/b/(?P<slug>[^/]+)/(?P<view>slots|availability)$")
+POOL_SIZE = int(os.environ.get("ASYNC_POOL_SIZE") or 10)
+MAX_OVERFLOW = int(os.environ.get("ASYNC_MAX_OVERFLOW") or 20)
+SLOTS_MAX_AGE = int(os.environ.get("SLOTS_MAX_AGE") or 10)
+USE_BITMAPS = os.environ.get("AVAILABILITY_USE_BITMAPS", "1") == "1"
+
+engine = None
+
+
+def async_database_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    url = url.set(drivername=ASYNC_DRIVERS.get(backend, url.drivername))
+    if backend in ("postgresql", "postgres") and "sslmode" in url.query:
+        # asyncpg spells libpq's sslmode as ssl
+        query = dict(url.query)
+        query["ssl"] = query.pop("sslmode")
+        url = url.set(query=query)
+    return url
+
+
+def create_engine_from_env():
+    url = async_database_url(os.environ.get("DATABASE_URL") or "sqlite:///local.db")
+    options = {"pool_recycle": 300, "pool_pre_ping": True}
+    if url.get_backend_name() != "sqlite":
+        options.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW)
+    return create_async_engine(url, **options)
+
+
+def tenant_statement(slug, service_id):
+    return select(Business.id, Business.version, Service.id, Service.duration_minutes).outerjoin(
+        Service, and_(Service.business_id == Business.id, Service.id == service_id, Service.is_active.is_(True))
+    ).where(Business.slug == slug, Business.is_active.is_(True))
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value or "", "%Y-%m-%d").date()
+    except ValueError:
+        return None
+
+
+def reads_bitmap(working_hour, duration):
+    # the same rule availability._day_slots applies through bitmaps.use_bitmaps
+    return USE_BITMAPS and supports_bitmap(to_minutes(working_hour.open_time), duration)
+
+
+async def day_availability(conn, business_id, version, service_id, duration, booking_date):
+    if booking_date < date.today():
+        return []
+    # same key as get_available_slots, so the version stamp keeps this process's entries fresh
+    full_key = availability_cache.key(business_id, (service_id, booking_date, version))
+    slots = availability_cache.lookup(full_key)
+    if slots is None:
+        working_hour = (await conn.execute(working_hour_statement(business_id, booking_date.weekday()))).first()
+        slots = ()
+        if working_hour and not working_hour.is_closed and reads_bitmap(working_hour, duration):
+            occupied = decode((await conn.execute(day_bitmap_statement(business_id, booking_date))).scalar())
+            slots = day_slots(working_hour, duration, occupied=occupied)
+        elif working_hour and not working_hour.is_closed:
+            rows = (await conn.execute(busy_rows_statement(business_id, Booking.booking_date == booking_date))).all()
+            slots = day_slots(working_hour, duration, busy_intervals_by_date(rows).get(booking_date, []))
+        availability_cache.store(full_key, slots)
+    return visible_slots(slots, booking_date)
+
+
+async def range_availability(conn, business_id, duration, start_date, end_date):
+    hours = {
+        row.day_of_week: row for row in await conn.execute(
+            select(WorkingHour.day_of_week, WorkingHour.open_time, WorkingHour.close_time, WorkingHour.is_closed)
+            .where(WorkingHour.business_id == business_id)
+        )
+    }
+    open_days = [row for row in hours.values() if not row.is_closed]
+    occupied_by_date = busy_by_date = {}
+    if any(reads_bitmap(row, duration) for row in open_days):
+        occupied_by_date = decode_by_date((await conn.execute(
+            bitmaps_by_date_statement(business_id, start_date, end_date)
+        )).all())
+    if not all(reads_bitmap(row, duration) for row in open_days):
+        rows = (await conn.execute(busy_rows_statement(
+            business_id, Booking.booking_date >= start_date, Booking.booking_date <= end_date
+        ))).all()
+        busy_by_date = busy_intervals_by_date(rows)
+
+    today = date.today()
+    availability = {}
+    current = start_date
+    while current <= end_date:
+        slots = []
+        working_hour = hours.get(current.weekday())
+        if current >= today and working_hour and reads_bitmap(working_hour, duration):
+            slots = visible_slots(day_slots(working_hour, duration, occupied=occupied_by_date.get(current, 0)), current)
+        elif current >= today:
+            slots = visible_slots(day_slots(working_hour, duration, busy_by_date.get(current, [])), current)
+        availability[current.isoformat()] = slots
+        current += timedelta(days=1)
+    return availability
+
+
+async def handle(view, slug, params, if_none_match):
+    service_id = params.get("service_id", [""])[0]
+    service_id = int(service_id) if service_id.isdigit() else None
+    empty = {"slots": []} if view == "slots" else {"availability": {}}
+
+    async with engine.connect() as conn:
+        tenant = (await conn.execute(tenant_statement(slug, service_id))).first()
+        if tenant is None:
+            return 404, {"error": "not found"}, None
+        business_id, version, found_service_id, duration = tenant
+        if service_id is None or found_service_id is None:
+            return 200, empty, None
+
+        if view == "slots":
+            booking_date = parse_date(params.get("date", [""])[0])
+            if booking_date is None:
+                return 200, empty, None
+            etag = "-".join(str(part) for part in (business_id, version, service_id, booking_date.isoformat())
+                            + slot_clock(booking_date))
+            if if_none_match and etag in if_none_match:
+                return 304, None, etag
+            slots = await day_availability(conn, business_id, version, service_id, duration, booking_date)
+            return 200, {"slots": slots}, etag
+
+        start_date = parse_date(params.get("from", [""])[0])
+        end_date = parse_date((params.get("to") or params.get("from", [""]))[0])
+        if start_date is None or end_date is None or end_date < start_date:
+            return 200, empty, None
+        end_date = min(end_date, start_date + timedelta(days=MAX_RANGE_DAYS - 1))
+        etag = "-".join(str(part) for part in (business_id, version, service_id, start_date.isoformat(),
+                                               end_date.isoformat()) + slot_clock(start_date, end_date))
+        if if_none_match and etag in if_none_match:
+            return 304, None, etag
+        availability = await range_availability(conn, business_id, duration, start_date, end_date)
+        return 200, {"from": start_date.isoformat(), "to": end_date.isoformat(), "availability": availability}, etag
+
+
+async def send_response(send, status, payload=None, etag=None, head=False):
+    body = json.dumps(payload).encode() if payload is not None else b""
+    headers = [(b"access-control-allow-origin", b"*")]
+    if payload is not None:
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    if etag is not None:
+        headers += [(b"etag", f'W/"{etag}"'.encode()), (b"cache-control", f"public, max-age={SLOTS_MAX_AGE}".encode())]
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    # HEAD keeps the GET headers, content-length included, but sends no body
+    await send({"type": "http.response.body", "body": b"" if head else body})
+
+
+async def lifespan(receive, send):
+    global engine
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # created per process, after any fork by the process manager
+            engine = create_engine_from_env()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            if engine is not None:
+                await engine.dispose()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    global engine
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    head = scope["method"] == "HEAD"
+    match = ROUTE.match(scope["path"])
+    if match is None or scope["method"] not in ("GET", "HEAD"):
+        await send_response(send, 404, {"error": "not found"}, head=head)
+        return
+    if engine is None:
+        engine = create_engine_from_env()
+
+    headers = dict(scope["headers"])
+    if_none_match = [tag.strip().removeprefix("W/").strip('"')
+                     for tag in headers.get(b"if-none-match", b"").decode().split(",") if tag.strip()]
+    params = parse_qs(scope["query_string"].decode())
+    status, payload, etag = await handle(match.group("view"), match.group("slug"), params, if_none_match)
+    await send_response(send, status, payload, etag, head=head)
@@ -0,0 +1,286 @@
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+import numpy as np
+from sqlalchemy import select
+from extensions import db
+from cache import MemoryBackend, TenantCache
+from models import WorkingHour, Booking, booking_end_time
+
+ACTIVE_STATUSES = ("pending", "confirmed")
+SLOT_STEP_MINUTES = 30
+MAX_RANGE_DAYS = 60
+CACHE_MAX_ENTRIES = 4096
+# Bounds staleness when another worker process handled the write.
+CACHE_TTL_SECONDS = 60
+NEXT_AVAILABLE_DAYS = 14
+
+availability_cache = TenantCache("slots", MemoryBackend(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS))
+
+
+def to_minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def format_minutes(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def busy_rows_statement(business_id, *criteria):
+    return select(Booking.booking_date, Booking.booking_time, Booking.duration_minutes).where(
+        Booking.business_id == business_id,
+        Booking.status.in_(ACTIVE_STATUSES),
+        *criteria
+    )
+
+
+def working_hour_statement(business_id, day_of_week):
+    return select(WorkingHour.open_time, WorkingHour.close_time, WorkingHour.is_closed).where(
+        WorkingHour.business_id == business_id,
+        WorkingHour.day_of_week == day_of_week
+    ).limit(1)
+
+
+def _busy_rows(business_id, *criteria):
+    return db.session.execute(busy_rows_statement(business_id, *criteria)).all()
+
+
+def load_busy_intervals(business_id, booking_date):
+    rows = _busy_rows(business_id, Booking.booking_date == booking_date)
+    return [(to_minutes(start), to_minutes(start) + duration) for _, start, duration in rows]
+
+
+def find_overlapping_booking(business_id, booking_date, start_time, end_time, exclude_booking_id=None):
+    query = db.session.query(Booking.id).filter(
+        Booking.business_id == business_id,
+        Booking.booking_date == booking_date,
+        Booking.status.in_(ACTIVE_STATUSES),
+        Booking.booking_time < end_time,
+        Booking.end_time > start_time
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.id != exclude_booking_id)
+    return query.limit(1).scalar()
+
+
+def load_busy_intervals_by_date(business_id, start_date, end_date):
+    return busy_intervals_by_date(
+        _busy_rows(business_id, Booking.booking_date >= start_date, Booking.booking_date <= end_date)
+    )
+
+
+def busy_intervals_by_date(rows):
+    intervals = defaultdict(list)
+    for booking_date, start, duration in rows:
+        intervals[booking_date].append((to_minutes(start), to_minutes(start) + duration))
+    return {booking_date: merge_intervals(day) for booking_date, day in intervals.items()}
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+def free_slots(open_minute, close_minute, duration, busy, step=SLOT_STEP_MINUTES):
+    # busy must be merged, so both starts and ends are sorted
+    starts = [start for start, _ in busy]
+    ends = [end for _, end in busy]
+    slots = []
+    current = open_minute
+    while current + duration <= close_minute:
+        index = bisect_right(ends, current)
+        if index < len(starts) and starts[index] < current + duration:
+            # jump past the blocking interval, staying on the step grid
+            blocked_until = ends[index]
+            current += -(-(blocked_until - current) // step) * step
+            continue
+        slots.append(current)
+        current += step
+    return slots
+
+
+def _day_slots(business, service, booking_date, working_hour=None, busy=None, occupied=None):
+    import bitmaps
+    if working_hour is None:
+        working_hour = WorkingHour.query.filter_by(
+            business_id=business.id,
+            day_of_week=booking_date.weekday()
+        ).first()
+
+    if not working_hour or working_hour.is_closed:
+        return ()
+
+    duration = service.duration_minutes
+    if busy is None and bitmaps.use_bitmaps() and bitmaps.supports_bitmap(to_minutes(working_hour.open_time), duration):
+        if occupied is None:
+            occupied = bitmaps.load_day_bitmap(business.id, booking_date)
+        return day_slots(working_hour, duration, occupied=occupied)
+
+    if busy is None:
+        busy = merge_intervals(load_busy_intervals(business.id, booking_date))
+
+    return day_slots(working_hour, duration, busy)
+
+
+def day_slots(working_hour, duration, busy=(), occupied=None):
+    # occupied is a day bitmap and is only passed when bitmaps.supports_bitmap holds for the day
+    import bitmaps
+    if not working_hour or working_hour.is_closed:
+        return ()
+    open_minute = to_minutes(working_hour.open_time)
+    close_minute = to_minutes(working_hour.close_time)
+    if occupied is not None:
+        return tuple(bitmaps.bitmap_free_slots(open_minute, close_minute, duration, occupied, SLOT_STEP_MINUTES))
+    return tuple(free_slots(open_minute, close_minute, duration, busy))
+
+
+def visible_slots(slots, booking_date):
+    # past slots are filtered on read so cached entries for today stay valid
+    if booking_date == date.today():
+        now = to_minutes(datetime.now().time())
+        slots = [minute for minute in slots if minute > now]
+    return [format_minutes(minute) for minute in slots]
+
+
+def get_available_slots(business, service, booking_date, working_hour=None, busy=None, occupied=None,
+                        use_cache=True):
+    today = date.today()
+    if booking_date < today:
+        return []
+
+    # hours edits invalidate the business, so a caller-supplied working hour is still cacheable;
+    # the version stamp keeps entries from going stale after writes in other workers
+    if use_cache and busy is None and occupied is None:
+        slots = availability_cache.get_or_compute(
+            business.id, (service.id, booking_date, business.version),
+            lambda: _day_slots(business, service, booking_date, working_hour)
+        )
+    else:
+        slots = _day_slots(business, service, booking_date, working_hour, busy, occupied)
+
+    return visible_slots(slots, booking_date)
+
+
+def is_slot_available(business, service, booking_date, slot, exclude_booking_id=None):
+    # working hours, step grid and past-time rules first, then one range predicate on bookings
+    if slot not in get_available_slots(business, service, booking_date, busy=[], use_cache=False):
+        return False
+    start_time = datetime.strptime(slot, "%H:%M").time()
+    end_time = booking_end_time(booking_date, start_time, service.duration_minutes)
+    return find_overlapping_booking(business.id, booking_date, start_time, end_time, exclude_booking_id) is None
+
+
+def invalidate_availability(business_id):
+    availability_cache.invalidate(business_id)
+
+
+def get_availability_range(business, service, start_date, end_date, working_hours=None):
+    import bitmaps
+    if working_hours is None:
+        working_hours = WorkingHour.query.filter_by(business_id=business.id).all()
+    hours = {wh.day_of_week: wh for wh in working_hours}
+    if bitmaps.use_bitmaps():
+        occupied_by_date = bitmaps.load_bitmaps_by_date(business.id, start_date, end_date)
+    else:
+        busy_by_date = load_busy_intervals_by_date(business.id, start_date, end_date)
+
+    availability = {}
+    current = start_date
+    while current <= end_date:
+        working_hour = hours.get(current.weekday())
+        if working_hour and bitmaps.use_bitmaps():
+            slots = get_available_slots(business, service, current, working_hour=working_hour,
+                                        occupied=occupied_by_date.get(current, 0))
+        elif working_hour:
+            slots = get_available_slots(business, service, current, working_hour=working_hour,
+                                        busy=busy_by_date.get(current, []))
+        else:
+            slots = []
+        availability[current.isoformat()] = slots
+        current += timedelta(days=1)
+    return availability
+
+
+def batch_free_slots(days, durations, busy_by_date, step=SLOT_STEP_MINUTES):
+    # days: [(date, open_minute, close_minute)]. Every day is laid out on one
+    # minute axis (day index * 1440), so the candidate grid and the merged busy
+    # intervals are single arrays and one searchsorted covers every service.
+    starts, closes, day_index = [], [], []
+    busy_starts, busy_ends = [], []
+    for index, (booking_date, open_minute, close_minute) in enumerate(days):
+        offset = index * 1440
+        grid = np.arange(open_minute, close_minute, step) + offset
+        starts.append(grid)
+        closes.append(np.full(len(grid), close_minute + offset))
+        day_index.append(np.full(len(grid), index))
+        for start, end in busy_by_date.get(booking_date, ()):
+            # clipped so a booking running past midnight stays within its own day
+            busy_starts.append(start + offset)
+            busy_ends.append(min(end, 1440) + offset)
+    if not starts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.zeros((len(durations), 0), dtype=bool)
+
+    starts = np.concatenate(starts)
+    closes = np.concatenate(closes)
+    day_index = np.concatenate(day_index)
+    # a sentinel past the last day means every candidate has a next busy interval
+    sentinel = len(days) * 1440
+    busy_starts = np.array(busy_starts + [sentinel], dtype=np.int64)
+    busy_ends = np.array(busy_ends + [sentinel], dtype=np.int64)
+
+    # the first busy interval ending after a candidate start is the only one
+    # that can overlap it, since merged intervals are sorted and disjoint
+    blocking_start = busy_starts[np.searchsorted(busy_ends, starts, side="right")]
+
+    ends = starts[None, :] + np.asarray(durations, dtype=np.int64)[:, None]
+    free = (ends <= closes) & (blocking_start >= ends)
+    return starts - day_index * 1440, day_index, free
+
+
+def get_batch_availability(business, services, start_date, end_date, working_hours=None):
+    if working_hours is None:
+        working_hours = WorkingHour.query.filter_by(business_id=business.id).all()
+    hours = {wh.day_of_week: wh for wh in working_hours}
+    first_date = max(start_date, date.today())
+
+    dates = []
+    days = []
+    current = start_date
+    while current <= end_date:
+        dates.append(current)
+        working_hour = hours.get(current.weekday())
+        if current >= first_date and working_hour and not working_hour.is_closed:
+            days.append((current, to_minutes(working_hour.open_time), to_minutes(working_hour.close_time)))
+        current += timedelta(days=1)
+
+    busy_by_date = load_busy_intervals_by_date(business.id, first_date, end_date) if days else {}
+    minutes, day_index, free = batch_free_slots(days, [service.duration_minutes for service in services],
+                                                busy_by_date)
+
+    # candidates are laid out day by day, so each day is a contiguous slice
+    bounds = np.searchsorted(day_index, np.arange(len(days) + 1))
+    availability = {}
+    for row, service in zip(free, services):
+        by_date = {booking_date.isoformat(): [] for booking_date in dates}
+        for index, (booking_date, _, _) in enumerate(days):
+            day = slice(bounds[index], bounds[index + 1])
+            by_date[booking_date.isoformat()] = visible_slots(minutes[day][row[day]].tolist(), booking_date)
+        availability[service.id] = by_date
+    return availability
+
+
+def get_next_available(business, services, start_date, days=NEXT_AVAILABLE_DAYS, working_hours=None):
+    availability = get_batch_availability(business, services, start_date, start_date + timedelta(days=days - 1),
+                                          working_hours=working_hours)
+    next_available = {}
+    for service in services:
+        next_available[service.id] = next(
+            ({"date": day, "time": slots[0]} for day, slots in availability[service.id].items() if slots), None
+        )
+    return next_available
@@ -0,0 +1,84 @@
+"""Compare batch availability for every service against the per-service loop.
+
+Usage: python benchmarks/batch_availability.py [--businesses 10] [--services 8] [--days 14] [--repeat 5]
+
+Both paths run cold (availability cache cleared) over the same date range and
+must return identical slots. Runs against DATABASE_URL when set, otherwise a
+throwaway SQLite file.
+"""
+import argparse
+import time as clock
+from datetime import timedelta
+
+from dataset import setup_app, seed_dataset
+
+
+def per_service(business, services, start_date, end_date):
+    from availability import get_availability_range
+    return {service.id: get_availability_range(business, service, start_date, end_date) for service in services}
+
+
+def batch(business, services, start_date, end_date):
+    from availability import get_batch_availability
+    return get_batch_availability(business, services, start_date, end_date)
+
+
+def measure(fn, businesses, start_date, end_date, repeat):
+    from sqlalchemy import event
+    from extensions import db
+    from availability import invalidate_availability
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        timings = []
+        results = {}
+        for _ in range(repeat):
+            queries[0] = 0
+            started = clock.perf_counter()
+            for business, services in businesses:
+                invalidate_availability(business.id)
+                results[business.id] = fn(business, services, start_date, end_date)
+            timings.append(clock.perf_counter() - started)
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+    return min(timings), queries[0], results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--businesses", type=int, default=10)
+    parser.add_argument("--services", type=int, default=8)
+    parser.add_argument("--bookings-per-day", type=int, default=8)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = setup_app()
+    dataset = seed_dataset(app, businesses=args.businesses, services=args.services,
+                           bookings_per_day=args.bookings_per_day, days=args.days, prefix="batch")
+    from models import Business, Service
+    with app.app_context():
+        businesses = []
+        for slug, _, _ in dataset.businesses:
+            business = Business.query.filter_by(slug=slug).one()
+            businesses.append((business, Service.query.filter_by(business_id=business.id, is_active=True).all()))
+        start_date = dataset.start_date
+        end_date = start_date + timedelta(days=args.days - 1)
+
+        loop_time, loop_queries, expected = measure(per_service, businesses, start_date, end_date, args.repeat)
+        batch_time, batch_queries, actual = measure(batch, businesses, start_date, end_date, args.repeat)
+        assert actual == expected, "batch availability differs from the per-service loop"
+
+    cells = args.businesses * args.services * args.days
+    print(f"{args.businesses} businesses x {args.services} services x {args.days} days ({cells} service-days)")
+    print(f"per-service loop: {loop_time * 1000:8.1f} ms  {loop_queries:5d} queries")
+    print(f"batch:            {batch_time * 1000:8.1f} ms  {batch_queries:5d} queries  "
+          f"({loop_time / batch_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
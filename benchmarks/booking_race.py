@@ -0,0 +1,89 @@
+"""Fire parallel booking requests at one slot and check exactly one wins.
+
+Usage: python benchmarks/booking_race.py [--requests 32] [--threads 16]
+
+Runs against DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import time as clock
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+
+from dataset import setup_app
+
+
+def seed(app):
+    from extensions import db
+    from models import User, Business, Service, WorkingHour
+    with app.app_context():
+        owner = User(email=f"race-{clock.time_ns()}@example.com", first_name="Race", last_name="Owner")
+        owner.set_password("race-password")
+        db.session.add(owner)
+        db.session.flush()
+        business = Business(name=f"Race Test {clock.time_ns()}", owner_id=owner.id)
+        business.generate_slug()
+        db.session.add(business)
+        db.session.flush()
+        service = Service(business_id=business.id, name="Cut", price=20, duration_minutes=30)
+        db.session.add(service)
+        for day in range(7):
+            db.session.add(WorkingHour(business_id=business.id, day_of_week=day,
+                                       open_time=time(0, 0), close_time=time(23, 30), is_closed=False))
+        db.session.commit()
+        return business.slug, business.id, service.id
+
+
+def post_booking(app, slug, service_id, booking_date, slot, name):
+    client = app.test_client()
+    started = clock.perf_counter()
+    response = client.post(f"/b/{slug}/book", data={
+        "service_id": service_id,
+        "booking_date": booking_date.isoformat(),
+        "booking_time": slot,
+        "customer_name": name,
+        "customer_phone": "5550000000",
+    })
+    won = response.status_code == 302 and "/confirmation/" in response.headers.get("Location", "")
+    return won, clock.perf_counter() - started
+
+
+def run(app, jobs, threads):
+    started = clock.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda job: post_booking(app, *job), jobs))
+    return results, clock.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    app = setup_app()
+    from models import Booking
+    slug, business_id, service_id = seed(app)
+    booking_date = date.today() + timedelta(days=1)
+
+    jobs = [(slug, service_id, booking_date, "10:00", f"Racer {i}") for i in range(args.requests)]
+    results, elapsed = run(app, jobs, args.threads)
+    winners = sum(1 for won, _ in results if won)
+    with app.app_context():
+        stored = Booking.query.filter_by(business_id=business_id, booking_date=booking_date).count()
+    print(f"same slot:     {args.requests} requests, {winners} succeeded, {stored} stored, "
+          f"{args.requests / elapsed:.1f} req/s")
+    assert winners == 1 and stored == 1, "double booking detected"
+
+    # distinct slots on distinct days measure throughput when nothing conflicts
+    jobs = [(slug, service_id, booking_date + timedelta(days=1 + i // 40), f"{(i % 40) // 2 + 2:02d}:{(i % 2) * 30:02d}",
+             f"Customer {i}") for i in range(args.requests)]
+    results, elapsed = run(app, jobs, args.threads)
+    winners = sum(1 for won, _ in results if won)
+    latencies = sorted(latency for _, latency in results)
+    print(f"free slots:    {args.requests} requests, {winners} succeeded, "
+          f"{args.requests / elapsed:.1f} req/s, p50 {latencies[len(latencies) // 2] * 1000:.1f} ms")
+    assert winners == args.requests, "non-conflicting bookings were rejected"
+
+
+if __name__ == "__main__":
+    main()
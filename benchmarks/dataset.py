@@ -0,0 +1,110 @@
+"""Synthetic dataset for benchmarks, built through the application's models."""
+import os
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = "bench-password"
+SERVICE_DURATIONS = [30, 45, 60, 30, 90]
+OPEN_TIME = time(9, 0)
+CLOSE_TIME = time(17, 0)
+
+
+def setup_app(database_url=None):
+    if database_url:
+        os.environ["DATABASE_URL"] = database_url
+    elif not os.environ.get("DATABASE_URL"):
+        path = os.path.join(tempfile.mkdtemp(), "bench.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{path}"
+    from app import app
+    import migrations
+    app.config["WTF_CSRF_ENABLED"] = False
+    with app.app_context():
+        migrations.upgrade()
+    return app
+
+
+class Dataset:
+    def __init__(self, admin_email, businesses, start_date, days):
+        self.admin_email = admin_email
+        # [(slug, owner_email, [(service_id, duration_minutes)])]
+        self.businesses = businesses
+        self.start_date = start_date
+        self.days = days
+        self.bookings = 0
+
+    @property
+    def first_free_date(self):
+        return self.start_date + timedelta(days=self.days)
+
+
+def seed_dataset(app, businesses=10, services=5, bookings_per_day=12, days=14, prefix="bench"):
+    from extensions import db
+    from models import User, Business, Service, WorkingHour, Booking, booking_end_time
+    import stats
+    import bitmaps
+    import rollups
+
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S%f")
+    start_date = date.today() + timedelta(days=1)
+
+    with app.app_context():
+        # hashing is deliberately slow, so every synthetic user shares one hash
+        template = User(email="", first_name="", last_name="")
+        template.set_password(PASSWORD)
+        password_hash = template.password_hash
+
+        admin = User(email=f"{prefix}-admin-{run_id}@example.com", first_name="Bench", last_name="Admin",
+                     password_hash=password_hash, is_admin=True)
+        db.session.add(admin)
+
+        seeded = []
+        for b in range(businesses):
+            owner = User(email=f"{prefix}-owner-{run_id}-{b}@example.com", first_name="Bench",
+                         last_name=f"Owner {b}", password_hash=password_hash)
+            db.session.add(owner)
+            db.session.flush()
+            business = Business(name=f"{prefix} {run_id} {b}", slug=f"{prefix}-{run_id}-{b}", owner_id=owner.id)
+            db.session.add(business)
+            db.session.flush()
+            rows = [Service(business_id=business.id, name=f"Service {s}", price=20 + s * 5,
+                            duration_minutes=SERVICE_DURATIONS[s % len(SERVICE_DURATIONS)])
+                    for s in range(services)]
+            db.session.add_all(rows)
+            db.session.add_all([WorkingHour(business_id=business.id, day_of_week=day, open_time=OPEN_TIME,
+                                            close_time=CLOSE_TIME, is_closed=False) for day in range(7)])
+            db.session.flush()
+            seeded.append((business.slug, business.id, owner.email, [(s.id, s.duration_minutes) for s in rows]))
+        db.session.commit()
+
+        dataset = Dataset(admin.email, [(slug, email, svc) for slug, _, email, svc in seeded], start_date, days)
+        close_minute = CLOSE_TIME.hour * 60 + CLOSE_TIME.minute
+        for slug, business_id, _, service_rows in seeded:
+            batch = []
+            for offset in range(days):
+                booking_date = start_date + timedelta(days=offset)
+                minute = OPEN_TIME.hour * 60 + OPEN_TIME.minute
+                for n in range(bookings_per_day):
+                    service_id, duration = service_rows[n % len(service_rows)]
+                    if minute + duration > close_minute:
+                        break
+                    booking_time = time(minute // 60, minute % 60)
+                    batch.append({
+                        "business_id": business_id, "service_id": service_id,
+                        "customer_name": f"Customer {n}", "customer_phone": "5550000000",
+                        "booking_date": booking_date, "booking_time": booking_time,
+                        "duration_minutes": duration,
+                        "end_time": booking_end_time(booking_date, booking_time, duration),
+                        "status": "confirmed" if n % 3 else "pending",
+                    })
+                    minute += duration
+            if batch:
+                db.session.execute(Booking.__table__.insert(), batch)
+            dataset.bookings += len(batch)
+        stats.rebuild_counters(db.session.connection())
+        bitmaps.rebuild_bitmaps(db.session.connection())
+        rollups.rebuild_rollups(db.session.connection(), start_date, start_date + timedelta(days=days))
+        db.session.commit()
+    return dataset
@@ -0,0 +1,307 @@
+"""Load-test the booking flow and report latency, queries per request and throughput.
+
+Usage:
+    python benchmarks/load.py --businesses 20 --bookings-per-day 12 --requests 200
+    python benchmarks/load.py --mode gunicorn --workers 4 --output after.json --compare before.json
+
+Runs against DATABASE_URL (SQLite or PostgreSQL) when set, otherwise a
+throwaway SQLite file, so it needs no network access.
+"""
+import argparse
+import http.cookiejar
+import itertools
+import json
+import math
+import os
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time as clock
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from dataset import PASSWORD, setup_app, seed_dataset
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["slots", "book", "dashboard_bookings", "admin_bookings"]
+ENDPOINTS = {
+    "slots": "booking.get_slots",
+    "book": "booking.book",
+    "dashboard_bookings": "dashboard.bookings",
+    "admin_bookings": "admin.bookings",
+}
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def free_slots(dataset):
+    # 30-minute slots on days after the seeded range, unique across the run
+    for offset in itertools.count():
+        booking_date = dataset.first_free_date + timedelta(days=offset)
+        for slug, _, services in dataset.businesses:
+            service_id = next(sid for sid, duration in services if duration == 30)
+            for minute in range(9 * 60, 17 * 60, 60):
+                yield slug, service_id, booking_date, f"{minute // 60:02d}:{minute % 60:02d}"
+
+
+class ClientDriver:
+    # Flask test client in-process; one client (cookie jar) per worker thread.
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def client(self, email=None):
+        key = f"client_{email}"
+        client = getattr(self.local, key, None)
+        if client is None:
+            client = self.app.test_client()
+            if email:
+                client.post("/auth/login", data={"email": email, "password": PASSWORD})
+            setattr(self.local, key, client)
+        return client
+
+    def get(self, path, email=None):
+        return self.client(email).get(path).status_code
+
+    def post(self, path, data):
+        return self.client().post(path, data=data).status_code
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class HttpDriver:
+    # Real HTTP against a local gunicorn; CSRF tokens are scraped like a browser would.
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.local = threading.local()
+
+    def _session(self, email=None):
+        key = f"session_{email}"
+        session = getattr(self.local, key, None)
+        if session is None:
+            jar = http.cookiejar.CookieJar()
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar), _NoRedirect())
+            session = {"opener": opener, "token": None}
+            setattr(self.local, key, session)
+            if email:
+                token = self._token(session, "/auth/login")
+                self._request(session, "/auth/login", {"email": email, "password": PASSWORD, "csrf_token": token})
+        return session
+
+    def _request(self, session, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        try:
+            with session["opener"].open(self.base_url + path, data=body, timeout=30) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as exc:
+            return exc.code, ""
+
+    def _token(self, session, path):
+        _, html = self._request(session, path)
+        match = CSRF_PATTERN.search(html)
+        return match.group(1) if match else ""
+
+    def get(self, path, email=None):
+        return self._request(self._session(email), path)[0]
+
+    def post(self, path, data):
+        session = self._session()
+        if session["token"] is None:
+            session["token"] = self._token(session, path)
+        return self._request(session, path, dict(data, csrf_token=session["token"]))[0]
+
+
+def build_jobs(scenario, dataset, count, slot_source):
+    businesses = dataset.businesses
+    jobs = []
+    for n in range(count):
+        slug, owner_email, services = businesses[n % len(businesses)]
+        if scenario == "slots":
+            service_id = services[n % len(services)][0]
+            booking_date = dataset.start_date + timedelta(days=n % dataset.days)
+            jobs.append(("get", f"/b/{slug}/slots?service_id={service_id}&date={booking_date}", None))
+        elif scenario == "book":
+            slug, service_id, booking_date, slot = next(slot_source)
+            jobs.append(("post", f"/b/{slug}/book", {
+                "service_id": service_id, "booking_date": booking_date.isoformat(), "booking_time": slot,
+                "customer_name": f"Load Test {n}", "customer_phone": "5550000000",
+            }))
+        elif scenario == "dashboard_bookings":
+            jobs.append(("get", "/dashboard/bookings", owner_email))
+        elif scenario == "admin_bookings":
+            jobs.append(("get", "/admin/bookings", dataset.admin_email))
+    return jobs
+
+
+def run_scenario(driver, jobs, concurrency):
+    def execute(job):
+        method, path, extra = job
+        started = clock.perf_counter()
+        status = driver.get(path, extra) if method == "get" else driver.post(path, extra)
+        return clock.perf_counter() - started, status
+
+    # log every pool thread in before timing; the barrier makes each thread take one warm-up task
+    barrier = threading.Barrier(concurrency)
+    emails = {extra for method, _, extra in jobs if method == "get"} or {None}
+
+    def warm_up(_):
+        for email in emails:
+            driver.get("/", email)
+        barrier.wait()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(warm_up, range(concurrency)))
+        started = clock.perf_counter()
+        results = list(pool.map(execute, jobs))
+        elapsed = clock.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    return {
+        "requests": len(jobs),
+        "errors": errors,
+        "throughput_rps": round(len(jobs) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def queries_per_request(app, driver, dataset, scenario, slot_source, samples=20):
+    import instrumentation
+    endpoint = ENDPOINTS[scenario]
+    before = instrumentation.metrics.snapshot().get(endpoint, (0, 0, 0))
+    for method, path, extra in build_jobs(scenario, dataset, samples, slot_source):
+        driver.get(path, extra) if method == "get" else driver.post(path, extra)
+    after = instrumentation.metrics.snapshot().get(endpoint, (0, 0, 0))
+    requests = after[0] - before[0]
+    return round((after[2] - before[2]) / requests, 2) if requests else None
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(workers, threads):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(workers), "--threads", str(threads),
+         "-b", f"127.0.0.1:{port}", "--log-level", "warning", "app:app"],
+        cwd=REPO_ROOT, env=dict(os.environ, SLOW_REQUEST_MS="0")
+    )
+    deadline = clock.monotonic() + 30
+    while clock.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process, f"http://127.0.0.1:{port}"
+        except OSError:
+            if process.poll() is not None:
+                raise RuntimeError("gunicorn exited during startup")
+            clock.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn did not start within 30s")
+
+
+def print_report(results, baseline=None):
+    header = f"{'mode':<9} {'scenario':<19} {'req':>5} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}"
+    print(header)
+    print("-" * len(header))
+    for mode, scenarios in results["modes"].items():
+        for scenario, row in scenarios.items():
+            queries = row.get("queries_per_request")
+            print(f"{mode:<9} {scenario:<19} {row['requests']:>5} {row['errors']:>4} {row['throughput_rps']:>8} "
+                  f"{row['p50_ms']:>8} {row['p95_ms']:>8} {row['p99_ms']:>8} {'' if queries is None else queries:>6}")
+            old = (baseline or {}).get("modes", {}).get(mode, {}).get(scenario)
+            if old:
+                deltas = []
+                for key in ("throughput_rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"):
+                    if old.get(key) and row.get(key) is not None:
+                        deltas.append(f"{key} {100.0 * (row[key] - old[key]) / old[key]:+.1f}%")
+                print(f"{'':<9} {'vs baseline':<19} " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--businesses", type=int, default=10)
+    parser.add_argument("--services", type=int, default=5)
+    parser.add_argument("--bookings-per-day", type=int, default=12)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--mode", choices=["client", "gunicorn", "both"], default="client")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --output")
+    args = parser.parse_args()
+
+    app = setup_app(args.database_url)
+    app.config["SLOW_REQUEST_MS"] = 0
+    print(f"seeding {args.businesses} businesses x {args.services} services, "
+          f"{args.bookings_per_day} bookings/day for {args.days} days ...")
+    dataset = seed_dataset(app, args.businesses, args.services, args.bookings_per_day, args.days)
+    print(f"seeded {dataset.bookings} bookings into {os.environ['DATABASE_URL'].split('@')[-1]}")
+
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    slot_source = free_slots(dataset)
+    results = {
+        "database": os.environ["DATABASE_URL"].split("://")[0],
+        "scale": {"businesses": args.businesses, "services": args.services,
+                  "bookings_per_day": args.bookings_per_day, "days": args.days, "bookings": dataset.bookings},
+        "modes": {},
+    }
+
+    if args.mode in ("client", "both"):
+        driver = ClientDriver(app)
+        rows = {}
+        for scenario in scenarios:
+            rows[scenario] = run_scenario(driver, build_jobs(scenario, dataset, args.requests, slot_source),
+                                          args.concurrency)
+            rows[scenario]["queries_per_request"] = queries_per_request(app, driver, dataset, scenario, slot_source)
+        results["modes"]["client"] = rows
+
+    if args.mode in ("gunicorn", "both"):
+        process, base_url = start_gunicorn(args.workers, args.threads)
+        try:
+            driver = HttpDriver(base_url)
+            results["modes"]["gunicorn"] = {
+                scenario: run_scenario(driver, build_jobs(scenario, dataset, args.requests, slot_source),
+                                       args.concurrency)
+                for scenario in scenarios
+            }
+        finally:
+            process.terminate()
+            process.wait(timeout=10)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+    print_report(results, baseline)
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
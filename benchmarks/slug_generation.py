@@ -0,0 +1,60 @@
+"""Check that slug generation costs the same number of queries however many duplicates exist.
+
+Usage: python benchmarks/slug_generation.py [--duplicates 1000]
+
+Creates businesses that all share one name and records the queries and time
+spent picking each slug. Runs against DATABASE_URL when set, otherwise a
+throwaway SQLite file.
+"""
+import argparse
+import time as clock
+
+from dataset import PASSWORD, setup_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duplicates", type=int, default=1000)
+    parser.add_argument("--name", default=f"Hair Salon {clock.time_ns()}")
+    args = parser.parse_args()
+
+    app = setup_app()
+    from sqlalchemy import event
+    from extensions import db
+    from models import User, Business
+
+    with app.app_context():
+        owner = User(email=f"slug-{clock.time_ns()}@example.com", first_name="Slug", last_name="Owner")
+        owner.set_password(PASSWORD)
+        db.session.add(owner)
+        db.session.commit()
+
+        queries = [0]
+
+        def count(*args):
+            queries[0] += 1
+
+        samples = {}
+        checkpoints = {1, 10, 100, args.duplicates}
+        for n in range(1, args.duplicates + 1):
+            business = Business(name=args.name, owner_id=owner.id)
+            queries[0] = 0
+            event.listen(db.engine, "before_cursor_execute", count)
+            started = clock.perf_counter()
+            business.generate_slug()
+            elapsed = clock.perf_counter() - started
+            event.remove(db.engine, "before_cursor_execute", count)
+            db.session.add(business)
+            db.session.commit()
+            if n in checkpoints:
+                samples[n] = (business.slug, queries[0], elapsed)
+
+    for n, (slug, count, elapsed) in sorted(samples.items()):
+        print(f"business {n:5d}: {slug:40s} {count} queries  {elapsed * 1000:6.2f} ms")
+    counts = {count for _, count, _ in samples.values()}
+    assert counts == {1}, f"slug generation issued {sorted(counts)} queries"
+    assert samples[args.duplicates][0].endswith(f"-{args.duplicates - 1}"), "unexpected slug sequence"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Measure time to first request per worker, with and without a preloaded app.
+
+Usage: python benchmarks/startup.py [--workers 4] [--rounds 3]
+
+Mirrors what gunicorn does: the master forks N workers, each of which
+serves one request to a public booking page. Without preload every worker
+imports and builds the app after the fork; with preload the master imports
+it once and workers only open their own database connection. Runs against
+DATABASE_URL when set, otherwise a throwaway SQLite file.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time as clock
+
+import dataset
+
+
+def seed():
+    # seeded in a child so this process has not imported the app yet
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        app = dataset.setup_app()
+        data = dataset.seed_dataset(app, businesses=1, services=5, bookings_per_day=4, days=3, prefix="startup")
+        os.write(write_fd, data.businesses[0][0].encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as pipe:
+        slug = pipe.read()
+    os.waitpid(pid, 0)
+    return slug
+
+
+def fork_workers(count, path, app=None):
+    started = clock.perf_counter()
+    pipes = []
+    for _ in range(count):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            if app is None:
+                from app import app
+            status = app.test_client().get(path).status_code
+            os.write(write_fd, f"{status} {clock.perf_counter() - started}".encode())
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+
+    timings = []
+    for pid, read_fd in pipes:
+        with os.fdopen(read_fd) as pipe:
+            status, elapsed = pipe.read().split()
+        os.waitpid(pid, 0)
+        assert status == "200", f"first request returned {status}"
+        timings.append(float(elapsed))
+    return timings
+
+
+def report(label, timings):
+    print(f"{label:<10} first request per worker: median {statistics.median(timings) * 1000:7.1f} ms  "
+          f"max {max(timings) * 1000:7.1f} ms  ({len(timings)} workers)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    if not os.environ.get("DATABASE_URL"):
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    path = f"/b/{seed()}/"
+
+    cold = []
+    for _ in range(args.rounds):
+        cold += fork_workers(args.workers, path)
+    report("cold", cold)
+
+    started = clock.perf_counter()
+    from app import app
+    from extensions import db
+    print(f"preload    app import in master: {(clock.perf_counter() - started) * 1000:.1f} ms")
+    with app.app_context():
+        assert db.engine.pool.checkedin() == 0, "create_app opened a database connection"
+
+    preloaded = []
+    for _ in range(args.rounds):
+        preloaded += fork_workers(args.workers, path, app)
+    report("preload", preloaded)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+from flask import current_app
+from sqlalchemy import delete, event, inspect, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models import Booking, AvailabilityBitmap
+from availability import ACTIVE_STATUSES, to_minutes
+
+# Each business-day is stored as a bitmap of occupied 5-minute cells
+# (bit i covers minutes [5i, 5i + 5)). Working hours are applied when slots
+# are read, so editing hours never requires a rebuild.
+CELL_MINUTES = 5
+CELLS_PER_DAY = 24 * 60 // CELL_MINUTES
+BITMAP_BYTES = CELLS_PER_DAY // 8
+DAY_MASK = (1 << CELLS_PER_DAY) - 1
+
+
+def use_bitmaps():
+    return current_app.config.get("AVAILABILITY_USE_BITMAPS", False)
+
+
+def supports_bitmap(open_minute, duration):
+    # cells are exact only when every slot starts and ends on a cell boundary
+    return open_minute % CELL_MINUTES == 0 and duration % CELL_MINUTES == 0
+
+
+def occupy(occupied, start_minute, end_minute):
+    first = start_minute // CELL_MINUTES
+    last = min(CELLS_PER_DAY, -(-end_minute // CELL_MINUTES))
+    if last <= first:
+        return occupied
+    return occupied | (((1 << (last - first)) - 1) << first)
+
+
+def day_bitmap(rows):
+    occupied = 0
+    for start, duration in rows:
+        start_minute = to_minutes(start)
+        occupied = occupy(occupied, start_minute, start_minute + (duration or 0))
+    return occupied
+
+
+def encode(occupied):
+    return occupied.to_bytes(BITMAP_BYTES, "little")
+
+
+def decode(value):
+    return int.from_bytes(value, "little") if value else 0
+
+
+def bitmap_free_slots(open_minute, close_minute, duration, occupied, step):
+    cells = -(-duration // CELL_MINUTES)
+    # after the loop, bit i is set when cells i .. i + cells - 1 are all free;
+    # doubling the window keeps this at O(log cells) big-int operations
+    fits = ~occupied & DAY_MASK
+    span = 1
+    while span < cells:
+        shift = min(span, cells - span)
+        fits &= fits >> shift
+        span += shift
+    slots = []
+    current = open_minute
+    while current + duration <= close_minute:
+        if fits >> (current // CELL_MINUTES) & 1:
+            slots.append(current)
+        current += step
+    return slots
+
+
+def day_bitmap_statement(business_id, booking_date):
+    return select(AvailabilityBitmap.occupied).where(
+        AvailabilityBitmap.business_id == business_id,
+        AvailabilityBitmap.booking_date == booking_date
+    )
+
+
+def bitmaps_by_date_statement(business_id, start_date, end_date):
+    return select(AvailabilityBitmap.booking_date, AvailabilityBitmap.occupied).where(
+        AvailabilityBitmap.business_id == business_id,
+        AvailabilityBitmap.booking_date >= start_date,
+        AvailabilityBitmap.booking_date <= end_date
+    )
+
+
+def load_day_bitmap(business_id, booking_date):
+    return decode(db.session.execute(day_bitmap_statement(business_id, booking_date)).scalar())
+
+
+def load_bitmaps_by_date(business_id, start_date, end_date):
+    return decode_by_date(db.session.execute(bitmaps_by_date_statement(business_id, start_date, end_date)).all())
+
+
+def decode_by_date(rows):
+    return {booking_date: decode(occupied) for booking_date, occupied in rows}
+
+
+def _store(connection, business_id, booking_date, occupied):
+    table = AvailabilityBitmap.__table__
+    key = (table.c.business_id == business_id, table.c.booking_date == booking_date)
+    if not occupied:
+        connection.execute(delete(table).where(*key))
+        return
+    value = encode(occupied)
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table).values(business_id=business_id, booking_date=booking_date, occupied=value)
+        connection.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.business_id, table.c.booking_date],
+            set_={"occupied": value}
+        ))
+        return
+    result = connection.execute(update(table).where(*key).values(occupied=value))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(business_id=business_id, booking_date=booking_date, occupied=value))
+
+
+def refresh_day(connection, business_id, booking_date):
+    # recomputed from the day's rows rather than patched, so overlapping
+    # legacy bookings never leave a cell wrongly freed
+    if connection.dialect.name == "postgresql":
+        # the lock reserve_booking takes; re-entrant within its transaction
+        connection.execute(text("SELECT pg_advisory_xact_lock(:business_id, :day)"),
+                           {"business_id": business_id, "day": booking_date.toordinal()})
+    bookings = Booking.__table__
+    rows = connection.execute(
+        select(bookings.c.booking_time, bookings.c.duration_minutes).where(
+            bookings.c.business_id == business_id,
+            bookings.c.booking_date == booking_date,
+            bookings.c.status.in_(ACTIVE_STATUSES)
+        )
+    ).all()
+    _store(connection, business_id, booking_date, day_bitmap(rows))
+
+
+@event.listens_for(Booking, "after_insert")
+def _refresh_inserted_booking(mapper, connection, target):
+    if (target.status or "pending") in ACTIVE_STATUSES:
+        refresh_day(connection, target.business_id, target.booking_date)
+
+
+@event.listens_for(Booking, "after_update")
+def _refresh_updated_booking(mapper, connection, target):
+    state = inspect(target)
+    changed = [state.attrs[name].history for name in ("status", "booking_date", "booking_time", "duration_minutes")]
+    if not any(history.has_changes() for history in changed):
+        return
+    dates = {target.booking_date}
+    dates.update(value for value in state.attrs.booking_date.history.deleted if value is not None)
+    for booking_date in dates:
+        refresh_day(connection, target.business_id, booking_date)
+
+
+@event.listens_for(Booking, "after_delete")
+def _refresh_deleted_booking(mapper, connection, target):
+    refresh_day(connection, target.business_id, target.booking_date)
+
+
+def rebuild_bitmaps(connection, business_id=None):
+    table = AvailabilityBitmap.__table__
+    bookings = Booking.__table__
+    query = select(bookings.c.business_id, bookings.c.booking_date, bookings.c.booking_time,
+                   bookings.c.duration_minutes).where(bookings.c.status.in_(ACTIVE_STATUSES))
+    clear = delete(table)
+    if business_id is not None:
+        query = query.where(bookings.c.business_id == business_id)
+        clear = clear.where(table.c.business_id == business_id)
+    connection.execute(clear)
+
+    days = {}
+    for row_business_id, booking_date, booking_time, duration in connection.execute(query):
+        start_minute = to_minutes(booking_time)
+        key = (row_business_id, booking_date)
+        days[key] = occupy(days.get(key, 0), start_minute, start_minute + (duration or 0))
+    rows = [{"business_id": key[0], "booking_date": key[1], "occupied": encode(occupied)}
+            for key, occupied in days.items() if occupied]
+    if rows:
+        connection.execute(table.insert(), rows)
+    return len(rows)
+
+
+def init_app(app):
+    import click
+    from models import Business
+
+    app.config.setdefault("AVAILABILITY_USE_BITMAPS", False)
+
+    @app.cli.command("rebuild-availability-bitmaps")
+    @click.option("--business", "slug", default=None, help="Only rebuild this business.")
+    def rebuild_bitmaps_command(slug):
+        business_id = None
+        if slug:
+            business = Business.query.filter_by(slug=slug).first()
+            if not business:
+                raise click.ClickException(f"No business with slug '{slug}'.")
+            business_id = business.id
+        with db.engine.begin() as connection:
+            days = rebuild_bitmaps(connection, business_id)
+        print(f"Rebuilt availability bitmaps for {days} business-days.")
@@ -0,0 +1,332 @@
+import csv
+import io
+import json
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from extensions import db
+from models import Service, WorkingHour, Booking, booking_end_time
+from availability import ACTIVE_STATUSES, invalidate_availability, load_busy_intervals_by_date, to_minutes
+from stats import adjust_counter
+from httpcache import bump_business_version
+from bitmaps import refresh_day
+from rollups import add_booking, adjust_rollups
+from reservations import lock_business_days
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+EXPORT_FIELDS = ["id", "service", "booking_date", "booking_time", "duration_minutes", "status",
+                 "customer_name", "customer_phone", "customer_email", "notes", "created_at"]
+
+
+class ImportResult:
+    def __init__(self):
+        self.inserted = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+class UnreadableRow:
+    # stands in for a row the reader could not decode; it is rejected with this message
+    def __init__(self, message):
+        self.message = message
+
+
+def read_rows(stream, fmt):
+    # yields (line_number, row) without reading the whole stream, except for a
+    # JSON array, which has to be parsed in one go; its items are numbered from 1
+    line_number = 0
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(stream)
+            for row in reader:
+                line_number = reader.line_num
+                yield line_number, row
+        elif fmt == "jsonl":
+            for line_number, line in enumerate(stream, start=1):
+                if line.strip():
+                    try:
+                        yield line_number, json.loads(line)
+                    except ValueError:
+                        yield line_number, UnreadableRow("not valid JSON")
+        elif fmt == "json":
+            try:
+                rows = json.load(stream)
+            except json.JSONDecodeError as exc:
+                yield exc.lineno, UnreadableRow("the file is not valid JSON")
+                return
+            if not isinstance(rows, list):
+                yield 1, UnreadableRow("a JSON file must hold an array of bookings")
+                return
+            for line_number, row in enumerate(rows, start=1):
+                yield line_number, row
+        else:
+            raise ValueError(f"Unsupported import format: {fmt}")
+    except (UnicodeDecodeError, csv.Error):
+        # the stream can't be read past this point; rows already read still import
+        yield line_number + 1, UnreadableRow("stopped reading here: the rest of the file is not valid UTF-8 text")
+
+
+def text_stream(binary_stream):
+    return io.TextIOWrapper(binary_stream, encoding="utf-8-sig", newline="")
+
+
+def _text(row, key):
+    value = row.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def _parse_row(row, services_by_id, services_by_name, hours):
+    if isinstance(row, UnreadableRow):
+        raise ValueError(row.message)
+    if not isinstance(row, dict):
+        raise ValueError("row is not an object")
+    service = None
+    service_id = _text(row, "service_id")
+    if service_id:
+        if not service_id.isdigit():
+            raise ValueError("service_id must be an integer")
+        service = services_by_id.get(int(service_id))
+    elif _text(row, "service"):
+        service = services_by_name.get(_text(row, "service").lower())
+    if service is None:
+        raise ValueError("unknown service")
+
+    try:
+        booking_date = datetime.strptime(_text(row, "booking_date"), "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("booking_date must be a date in YYYY-MM-DD format") from None
+    try:
+        booking_time = datetime.strptime(_text(row, "booking_time")[:5], "%H:%M").time()
+    except ValueError:
+        raise ValueError("booking_time must be a time in HH:MM format") from None
+    status = (_text(row, "status") or "pending").lower()
+    if status not in Booking.STATUS_CHOICES:
+        raise ValueError(f"invalid status '{status}'")
+    customer_name = _text(row, "customer_name")
+    customer_phone = _text(row, "customer_phone")
+    if not customer_name or not customer_phone:
+        raise ValueError("customer_name and customer_phone are required")
+
+    working_hour = hours.get(booking_date.weekday())
+    start = to_minutes(booking_time)
+    end = start + service.duration_minutes
+    if (not working_hour or working_hour.is_closed
+            or start < to_minutes(working_hour.open_time) or end > to_minutes(working_hour.close_time)):
+        raise ValueError("outside working hours")
+
+    return {
+        "service_id": service.id,
+        "booking_date": booking_date,
+        "booking_time": booking_time,
+        "status": status,
+        "duration_minutes": service.duration_minutes,
+        "price": service.price,
+        "end_time": booking_end_time(booking_date, booking_time, service.duration_minutes),
+        "customer_name": customer_name[:100],
+        "customer_phone": customer_phone[:20],
+        "customer_email": _text(row, "customer_email")[:120] or None,
+        "notes": _text(row, "notes") or None,
+    }, (start, end)
+
+
+def find_conflicts(candidates, busy):
+    # candidates: [(start, end, key)]; busy: merged intervals already booked.
+    # Returns the keys to reject: anything overlapping busy time, then a
+    # sorted sweep keeps the earliest of any overlapping candidates.
+    starts = [start for start, _ in busy]
+    ends = [end for _, end in busy]
+    rejected = set()
+    remaining = []
+    for start, end, key in candidates:
+        index = bisect_right(ends, start)
+        if index < len(starts) and starts[index] < end:
+            rejected.add(key)
+        else:
+            remaining.append((start, end, key))
+    last_end = None
+    for start, end, key in sorted(remaining):
+        if last_end is not None and start < last_end:
+            rejected.add(key)
+        else:
+            last_end = end
+    return rejected
+
+
+def _import_batch(business, batch, services_by_id, services_by_name, hours, result):
+    parsed = []
+    for line, row in batch:
+        try:
+            values, interval = _parse_row(row, services_by_id, services_by_name, hours)
+        except (ValueError, TypeError, AttributeError) as exc:
+            result.reject(line, str(exc))
+            continue
+        parsed.append((line, values, interval))
+    if not parsed:
+        return
+
+    dates = [values["booking_date"] for _, values, _ in parsed]
+    # the day locks reserve_booking takes, held until the commit, so a booking made
+    # meanwhile can't land between reading the busy intervals and inserting
+    lock_business_days(business.id, {values["booking_date"] for _, values, _ in parsed
+                                      if values["status"] in ACTIVE_STATUSES})
+    busy_by_date = load_busy_intervals_by_date(business.id, min(dates), max(dates))
+    candidates_by_date = defaultdict(list)
+    for index, (_, values, (start, end)) in enumerate(parsed):
+        if values["status"] in ACTIVE_STATUSES:
+            candidates_by_date[values["booking_date"]].append((start, end, index))
+    rejected = set()
+    for booking_date, candidates in candidates_by_date.items():
+        rejected |= find_conflicts(candidates, busy_by_date.get(booking_date, []))
+
+    rows = []
+    lines = []
+    status_counts = defaultdict(int)
+    for index, (line, values, _) in enumerate(parsed):
+        if index in rejected:
+            result.reject(line, "overlaps an existing booking")
+            continue
+        values["business_id"] = business.id
+        rows.append(values)
+        lines.append(line)
+        status_counts[values["status"]] += 1
+
+    if not rows:
+        db.session.rollback()
+        return
+    try:
+        # executemany; mapper events do not fire, so counters, the version stamp and bitmaps are updated here
+        db.session.execute(Booking.__table__.insert(), rows)
+        connection = db.session.connection()
+        for status, count in status_counts.items():
+            adjust_counter(connection, business.id, status, count)
+        bump_business_version(connection, business.id)
+        for booking_date in {values["booking_date"] for values in rows if values["status"] in ACTIVE_STATUSES}:
+            refresh_day(connection, business.id, booking_date)
+        deltas = {}
+        for values in rows:
+            add_booking(deltas, values["booking_date"], values["service_id"], values["status"],
+                        values["duration_minutes"], values["price"])
+        adjust_rollups(connection, business.id, deltas)
+        db.session.commit()
+    except (IntegrityError, OperationalError):
+        # e.g. the overlap constraint or a lock timeout; the batch is all or nothing
+        db.session.rollback()
+        for line in lines:
+            result.reject(line, "could not be saved alongside concurrent changes; import it again")
+        return
+    result.inserted += len(rows)
+
+
+def import_bookings(business, rows, batch_size=IMPORT_BATCH_SIZE):
+    services = Service.query.filter_by(business_id=business.id).all()
+    services_by_id = {service.id: service for service in services}
+    services_by_name = {service.name.strip().lower(): service for service in services}
+    hours = {wh.day_of_week: wh for wh in WorkingHour.query.filter_by(business_id=business.id).all()}
+
+    result = ImportResult()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        _import_batch(business, batch, services_by_id, services_by_name, hours, result)
+    if result.inserted:
+        invalidate_availability(business.id)
+    return result
+
+
+def export_rows(business_id):
+    stmt = select(
+        Booking.id, Service.name, Booking.booking_date, Booking.booking_time, Booking.duration_minutes,
+        Booking.status, Booking.customer_name, Booking.customer_phone, Booking.customer_email,
+        Booking.notes, Booking.created_at
+    ).join(Service, Booking.service_id == Service.id).where(
+        Booking.business_id == business_id
+    ).order_by(Booking.booking_date, Booking.booking_time, Booking.id).execution_options(
+        yield_per=EXPORT_CHUNK_SIZE
+    )
+    # yield_per streams through a server-side cursor where the driver supports it
+    for row in db.session.execute(stmt):
+        yield dict(zip(EXPORT_FIELDS, row))
+
+
+def _serializable(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def export_csv(business_id):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for count, row in enumerate(export_rows(business_id), start=1):
+        writer.writerow([_serializable(row[field]) for field in EXPORT_FIELDS])
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_jsonl(business_id):
+    lines = []
+    for row in export_rows(business_id):
+        lines.append(json.dumps({field: _serializable(value) for field, value in row.items()}))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+EXPORTERS = {
+    "csv": (export_csv, "text/csv"),
+    "jsonl": (export_jsonl, "application/x-ndjson"),
+}
+
+
+def format_for_filename(filename):
+    extension = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if extension == "json":
+        return "json"
+    return "jsonl" if extension in ("jsonl", "ndjson") else "csv"
+
+
+def init_app(app):
+    import click
+    from models import Business
+
+    @app.cli.command("import-bookings")
+    @click.argument("slug")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "json", "jsonl"]), default=None)
+    def import_bookings_command(slug, path, fmt):
+        business = Business.query.filter_by(slug=slug).first()
+        if not business:
+            raise click.ClickException(f"No business with slug '{slug}'.")
+        with open(path, encoding="utf-8-sig", newline="") as stream:
+            result = import_bookings(business, read_rows(stream, fmt or format_for_filename(path)))
+        print(f"Imported {result.inserted} bookings, rejected {result.rejected}.")
+        for line, message in result.errors:
+            print(f"  line {line}: {message}")
+
+    @app.cli.command("export-bookings")
+    @click.argument("slug")
+    @click.option("--format", "fmt", type=click.Choice(sorted(EXPORTERS)), default="csv")
+    @click.option("--output", type=click.File("w"), default="-")
+    def export_bookings_command(slug, fmt, output):
+        business = Business.query.filter_by(slug=slug).first()
+        if not business:
+            raise click.ClickException(f"No business with slug '{slug}'.")
+        exporter, _ = EXPORTERS[fmt]
+        for chunk in exporter(business.id):
+            output.write(chunk)
@@ -0,0 +1,126 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryBackend:
+    # In-process LRU store. A shared backend only has to provide the same
+    # get/set/delete/clear/counter/incr methods; counters must never be evicted.
+
+    def __init__(self, max_entries=4096, ttl=None, max_bytes=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # optional memory cap; sizes are shallow (sys.getsizeof), which is exact for strings
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def _evict(self, key):
+        self.size -= self._data.pop(key)[2]
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at, _ = item
+            if expires_at is not None and expires_at < time.monotonic():
+                self._evict(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        size = sys.getsizeof(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._evict(key)
+            self._data[key] = (value, expires_at, size)
+            self.size += size
+            while len(self._data) > self.max_entries or (self.max_bytes and self.size > self.max_bytes):
+                self._evict(next(iter(self._data)))
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._evict(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._counters.clear()
+            self.size = 0
+
+    def counter(self, key):
+        return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TenantCache:
+    # Entries are stored under the business's current generation, so
+    # invalidating a tenant is a single counter bump and old entries age out
+    # through LRU eviction.
+
+    def __init__(self, namespace, backend):
+        self.namespace = namespace
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def _generation_key(self, business_id):
+        return (self.namespace, "generation", business_id)
+
+    def key(self, business_id, key):
+        # resolve the generation before computing, so a concurrent invalidate
+        # leaves the computed value under the old generation
+        generation = self.backend.counter(self._generation_key(business_id))
+        return (self.namespace, business_id, generation) + tuple(key)
+
+    def lookup(self, full_key):
+        value = self.backend.get(full_key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def store(self, full_key, value):
+        self.backend.set(full_key, value)
+
+    def get_or_compute(self, business_id, key, compute):
+        full_key = self.key(business_id, key)
+        value = self.lookup(full_key)
+        if value is None:
+            value = compute()
+            self.store(full_key, value)
+        return value
+
+    def invalidate(self, business_id):
+        self.backend.incr(self._generation_key(business_id))
+
+    def clear(self):
+        self.backend.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self.backend),
+        }
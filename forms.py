@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, PasswordField, TextAreaField, DecimalField, IntegerField, SelectField, DateField, TimeField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, NumberRange, Optional, ValidationError
 from models import User
@@ -48,6 +49,9 @@ class BookingForm(FlaskForm):
     customer_email = StringField("Email (optional)", validators=[Optional(), Email()])
     notes = TextAreaField("Notes", validators=[Optional(), Length(max=500)])
 
+class BookingImportForm(FlaskForm):
+    file = FileField("Bookings file", validators=[FileRequired(), FileAllowed(["csv", "jsonl", "ndjson", "json"], "CSV, JSON or JSON Lines files only.")])
+
 class BookingStatusForm(FlaskForm):
     status = SelectField("Status", choices=[
         ("pending", "Pending"),
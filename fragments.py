@@ -0,0 +1,43 @@
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from cache import MemoryBackend, TenantCache
+
+FRAGMENT_CACHE_MAX_ENTRIES = 8192
+FRAGMENT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# hits are fragments served from cache, misses are fragments rendered
+fragment_cache = TenantCache("fragment", MemoryBackend(
+    max_entries=FRAGMENT_CACHE_MAX_ENTRIES, max_bytes=FRAGMENT_CACHE_MAX_BYTES
+))
+
+
+class FragmentCacheExtension(Extension):
+    # {% cache business, "services" %}...{% endcache %}
+    # The first argument is the tenant (a Business or tenant snapshot); its
+    # catalog stamp is part of the key, so a change to the business, its
+    # services or hours renders the block again while bookings do not.
+    # Blocks must therefore not show anything derived from bookings, nor
+    # per-user or per-session output such as CSRF tokens. Further arguments
+    # are extra key parts.
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        tenant = parser.parse_expression()
+        parts = []
+        while parser.stream.skip_if("comma"):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render_fragment", [tenant, nodes.List(parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, tenant, parts, caller):
+        key = (tenant.catalog_version,) + tuple(parts)
+        return Markup(fragment_cache.get_or_compute(tenant.id, key, lambda: str(caller())))
+
+
+def init_app(app):
+    app.config.setdefault("FRAGMENT_CACHE_MAX_BYTES", FRAGMENT_CACHE_MAX_BYTES)
+    fragment_cache.backend.max_bytes = app.config["FRAGMENT_CACHE_MAX_BYTES"]
+    app.jinja_env.add_extension(FragmentCacheExtension)
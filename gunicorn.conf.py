@@ -0,0 +1,42 @@
+import gc
+import multiprocessing
+import os
+
+# gunicorn app:app   (this file is read from the working directory by default)
+#
+# The app is imported once in the master and workers fork from it, so boot
+# cost and template/module memory are paid once. create_app opens no
+# connections, and each forked worker discards any pool it inherited.
+
+bind = f"0.0.0.0:{os.environ.get('PORT') or 5000}"
+workers = int(os.environ.get("WEB_CONCURRENCY") or multiprocessing.cpu_count() * 2 + 1)
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS") or 4)
+preload_app = True
+# recycling a worker is a cheap fork of the preloaded master
+max_requests = 2000
+max_requests_jitter = 200
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+
+def on_starting(server):
+    # schema changes run once per deploy in the master, never in worker boot;
+    # set MIGRATE_ON_START=0 when migrations run as a separate release step
+    if os.environ.get("MIGRATE_ON_START", "1") != "1":
+        return
+    from app import app
+    from extensions import db
+    import migrations
+    with app.app_context():
+        applied = migrations.upgrade()
+        db.engine.dispose()
+    if applied:
+        server.log.info("Applied migrations: %s", ", ".join(applied))
+
+
+def when_ready(server):
+    # keep the collector from touching preloaded objects, so their pages stay
+    # shared copy-on-write between workers
+    gc.freeze()
@@ -0,0 +1,99 @@
+from datetime import date, datetime, time, timezone
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import event, update
+from sqlalchemy.orm import object_session
+from werkzeug.http import is_resource_modified
+from models import Business, Service, WorkingHour, Booking
+
+
+def bump_business_version(connection, business_id, catalog=False):
+    table = Business.__table__
+    now = datetime.utcnow()
+    values = {"version": table.c.version + 1, "updated_at": now}
+    if catalog:
+        values["catalog_version"] = table.c.catalog_version + 1
+        values["catalog_updated_at"] = now
+    connection.execute(update(table).where(table.c.id == business_id).values(**values))
+
+
+def _bump_parent_version(mapper, connection, target):
+    bump_business_version(connection, target.business_id)
+
+
+def _bump_parent_catalog(mapper, connection, target):
+    bump_business_version(connection, target.business_id, catalog=True)
+
+
+for _name in ("after_insert", "after_update", "after_delete"):
+    event.listen(Booking, _name, _bump_parent_version)
+    for _model in (Service, WorkingHour):
+        event.listen(_model, _name, _bump_parent_catalog)
+
+
+@event.listens_for(Business, "before_update")
+def _bump_own_version(mapper, connection, target):
+    session = object_session(target)
+    if session is not None and session.is_modified(target, include_collections=False):
+        # incremented in SQL so a concurrent bump from a child row is never lost
+        target.version = Business.version + 1
+        target.catalog_version = Business.catalog_version + 1
+        target.updated_at = target.catalog_updated_at = datetime.utcnow()
+
+
+def shared_cacheable():
+    # navigation for logged-in users and flashed messages must never reach a shared cache
+    return not current_user.is_authenticated and "_flashes" not in session
+
+
+def slot_clock(start_date, end_date=None):
+    # past slots drop off as the day goes by, so the clock is part of the validator
+    today = date.today()
+    parts = (today.isoformat(),)
+    if start_date <= today <= (end_date or start_date):
+        now = datetime.now()
+        parts += (now.hour * 60 + now.minute,)
+    return parts
+
+
+def _utc(local):
+    return local.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def slots_last_modified(tenant, start_date, end_date=None):
+    # the later of the last booking write and the last tick of the clock slot_clock
+    # puts in the ETag, both as naive UTC like updated_at
+    today = date.today()
+    clock = _utc(datetime.combine(today, time()))
+    if start_date <= today <= (end_date or start_date):
+        clock = _utc(datetime.now().replace(second=0, microsecond=0))
+    return max(tenant.updated_at, clock) if tenant.updated_at else clock
+
+
+def conditional_response(tenant, max_age, render, parts=(), last_modified=None, stamp=None):
+    if not shared_cacheable():
+        response = make_response(render())
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    # pages that don't show bookings pass the catalog stamp and its time, so a
+    # booking changes neither their ETag nor their Last-Modified
+    etag = "-".join(str(part) for part in (tenant.id, stamp or tenant.version) + tuple(parts))
+    modified_at = last_modified or tenant.updated_at
+    if is_resource_modified(request.environ, etag=etag, last_modified=modified_at):
+        response = make_response(render())
+    else:
+        response = current_app.response_class(status=304)
+    response.set_etag(etag, weak=True)
+    if modified_at is not None:
+        response.last_modified = modified_at
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.vary.add("Cookie")
+    return response
+
+
+def init_app(app):
+    app.config.setdefault("PUBLIC_PAGE_MAX_AGE", 60)
+    app.config.setdefault("SLOTS_MAX_AGE", 10)
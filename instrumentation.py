@@ -0,0 +1,208 @@
+import hmac
+import logging
+import threading
+import time
+from flask import Response, current_app, g, has_request_context, request
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("melsconnect.slow_requests")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class RequestStats:
+    __slots__ = ("started", "query_count", "sql_time", "slowest_statement", "slowest_time",
+                 "render_time", "render_started")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.slowest_statement = None
+        self.slowest_time = 0.0
+        self.render_time = 0.0
+        self.render_started = None
+
+    def record_query(self, statement, elapsed):
+        self.query_count += 1
+        self.sql_time += elapsed
+        if elapsed > self.slowest_time:
+            self.slowest_time = elapsed
+            self.slowest_statement = statement
+
+
+class EndpointMetrics:
+    __slots__ = ("requests", "duration", "queries", "sql_time", "render_time", "slowest_query", "buckets")
+
+    def __init__(self):
+        self.requests = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.slowest_query = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._caches = {}
+
+    def observe(self, endpoint, duration, stats):
+        with self._lock:
+            metrics = self._endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self._endpoints[endpoint] = EndpointMetrics()
+            metrics.requests += 1
+            metrics.duration += duration
+            metrics.queries += stats.query_count
+            metrics.sql_time += stats.sql_time
+            metrics.render_time += stats.render_time
+            metrics.slowest_query = max(metrics.slowest_query, stats.slowest_time)
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if duration <= bound:
+                    metrics.buckets[index] += 1
+
+    def register_cache(self, name, cache):
+        self._caches[name] = cache
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: (m.requests, m.duration, m.queries, m.sql_time, m.render_time,
+                               m.slowest_query, list(m.buckets))
+                    for endpoint, m in self._endpoints.items()}
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        endpoints = sorted(self.snapshot().items())
+        family("melsconnect_request_duration_seconds", "histogram", "Request latency by endpoint.")
+        for endpoint, (requests, duration, _, _, _, _, buckets) in endpoints:
+            for bound, count in zip(LATENCY_BUCKETS, buckets):
+                lines.append(f'melsconnect_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+            lines.append(f'melsconnect_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {requests}')
+            lines.append(f'melsconnect_request_duration_seconds_sum{{endpoint="{endpoint}"}} {duration:.6f}')
+            lines.append(f'melsconnect_request_duration_seconds_count{{endpoint="{endpoint}"}} {requests}')
+
+        per_endpoint = [
+            ("melsconnect_request_queries_total", "counter", "SQL statements issued by endpoint.", 2, "{}"),
+            ("melsconnect_request_sql_seconds_total", "counter", "Time spent in SQL by endpoint.", 3, "{:.6f}"),
+            ("melsconnect_request_render_seconds_total", "counter", "Time spent rendering templates by endpoint.", 4, "{:.6f}"),
+            ("melsconnect_request_slowest_query_seconds", "gauge", "Slowest single SQL statement seen by endpoint.", 5, "{:.6f}"),
+        ]
+        for name, kind, help_text, index, fmt in per_endpoint:
+            family(name, kind, help_text)
+            for endpoint, values in endpoints:
+                lines.append(f'{name}{{endpoint="{endpoint}"}} {fmt.format(values[index])}')
+
+        if self._caches:
+            caches = sorted((name, cache.stats()) for name, cache in self._caches.items())
+            for key, kind in (("hits", "counter"), ("misses", "counter"), ("entries", "gauge")):
+                name = f"melsconnect_cache_{key}" + ("_total" if kind == "counter" else "")
+                family(name, kind, f"Cache {key} by cache.")
+                for cache_name, stats in caches:
+                    lines.append(f'{name}{{cache="{cache_name}"}} {stats[key]}')
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    timers = conn.info.get("query_started")
+    if not timers:
+        return
+    started = timers.pop()
+    if has_request_context():
+        stats = g.get("request_stats")
+        if stats is not None:
+            stats.record_query(statement, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, "handle_error")
+def _discard_query_timer(context):
+    timers = context.connection.info.get("query_started") if context.connection is not None else None
+    if timers:
+        timers.pop()
+
+
+def _start_request():
+    g.request_stats = RequestStats()
+
+
+def _note_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+def _finish_request(exc):
+    # teardown runs for every request, so ones that raise are counted as 500s
+    stats = g.pop("request_stats", None)
+    if stats is None:
+        return
+    duration = time.perf_counter() - stats.started
+    endpoint = request.endpoint or "unmatched"
+    status = 500 if exc is not None else g.pop("response_status", 500)
+    metrics.observe(endpoint, duration, stats)
+
+    threshold = current_app.config["SLOW_REQUEST_MS"]
+    if threshold and duration * 1000 >= threshold:
+        logger.warning(
+            "slow request %s %s endpoint=%s status=%s duration=%.1fms queries=%d sql=%.1fms "
+            "render=%.1fms slowest_query=%.1fms statement=%r",
+            request.method, request.path, endpoint, status, duration * 1000,
+            stats.query_count, stats.sql_time * 1000, stats.render_time * 1000,
+            stats.slowest_time * 1000, stats.slowest_statement
+        )
+
+
+def _start_render(sender, template, context, **extra):
+    stats = g.get("request_stats")
+    if stats is not None:
+        stats.render_started = time.perf_counter()
+
+
+def _stop_render(sender, template, context, **extra):
+    stats = g.get("request_stats")
+    if stats is not None and stats.render_started is not None:
+        stats.render_time += time.perf_counter() - stats.render_started
+        stats.render_started = None
+
+
+def metrics_view():
+    # per-endpoint timings are not public: without a token the route doesn't exist
+    token = current_app.config["METRICS_TOKEN"]
+    if not token:
+        return Response("Not Found\n", status=404, mimetype="text/plain")
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return Response("Forbidden\n", status=403, mimetype="text/plain")
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_app(app):
+    app.config.setdefault("INSTRUMENTATION_ENABLED", True)
+    app.config.setdefault("SLOW_REQUEST_MS", 500)
+    app.config.setdefault("METRICS_TOKEN", None)
+    if not app.config["INSTRUMENTATION_ENABLED"]:
+        return
+
+    app.before_request(_start_request)
+    app.after_request(_note_status)
+    app.teardown_request(_finish_request)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_stop_render, app)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
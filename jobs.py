@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, or_, select, update
+from extensions import db
+from models import Booking, Job
+
+logger = logging.getLogger("melsconnect.jobs")
+
+JOB_BATCH_SIZE = 50
+JOB_POLL_SECONDS = 2.0
+MAX_ATTEMPTS = 5
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 3600
+# a running job whose worker died is retried this long after it started
+LOCK_TIMEOUT_SECONDS = 300
+PRUNE_INTERVAL_SECONDS = 3600
+
+HANDLERS = {}
+
+
+def handler(kind):
+    def register(fn):
+        HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def enqueue(kind, payload=None, delay=0, max_attempts=MAX_ATTEMPTS):
+    # added to the caller's session, so the job commits or rolls back with the change that caused it
+    job = Job(kind=kind, payload=json.dumps(payload or {}), max_attempts=max_attempts,
+              run_at=datetime.utcnow() + timedelta(seconds=delay))
+    db.session.add(job)
+    return job
+
+
+def enqueue_status_change(booking, previous_status):
+    if booking.status != previous_status:
+        enqueue("booking.status_changed", {"booking_id": booking.id, "status": booking.status,
+                                           "previous_status": previous_status})
+
+
+def backoff_seconds(attempts):
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    # jitter keeps a burst of failures from retrying in lockstep
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _due(now):
+    return or_(
+        and_(Job.status == "queued", Job.run_at <= now),
+        and_(Job.status == "running", Job.locked_at < now - timedelta(seconds=LOCK_TIMEOUT_SECONDS))
+    )
+
+
+def claim_jobs(worker_id, batch_size=JOB_BATCH_SIZE):
+    now = datetime.utcnow()
+    query = select(Job.id).where(_due(now)).order_by(Job.run_at, Job.id).limit(batch_size)
+    if db.session.get_bind().dialect.name == "postgresql":
+        query = query.with_for_update(skip_locked=True)
+    ids = db.session.execute(query).scalars().all()
+    if not ids:
+        db.session.commit()
+        return []
+
+    # the status predicate is repeated so a job claimed concurrently is not claimed twice
+    token = f"{worker_id}:{uuid.uuid4().hex[:8]}"
+    db.session.execute(
+        update(Job).where(Job.id.in_(ids), _due(now)).values(
+            status="running", locked_by=token, locked_at=now, attempts=Job.attempts + 1
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    claimed = db.session.execute(
+        select(Job.id, Job.kind, Job.payload, Job.attempts, Job.max_attempts, Job.locked_by)
+        .where(Job.locked_by == token, Job.status == "running")
+        .order_by(Job.run_at, Job.id)
+    ).all()
+    db.session.commit()
+    return claimed
+
+
+def _start(job_id, token):
+    # restarts the lock clock, so jobs queued behind slow ones in a batch aren't
+    # reclaimed; a job another worker already reclaimed is skipped
+    result = db.session.execute(
+        update(Job).where(Job.id == job_id, Job.locked_by == token, Job.status == "running")
+        .values(locked_at=datetime.utcnow()),
+        execution_options={"synchronize_session": False}
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _finish(job_id):
+    db.session.execute(
+        update(Job).where(Job.id == job_id).values(
+            status="done", locked_by=None, locked_at=None, finished_at=datetime.utcnow()
+        ),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def _fail(job_id, attempts, max_attempts, error):
+    values = {"locked_by": None, "locked_at": None, "last_error": error[:2000]}
+    if attempts >= max_attempts:
+        values.update(status="failed", finished_at=datetime.utcnow())
+    else:
+        values.update(status="queued", run_at=datetime.utcnow() + timedelta(seconds=backoff_seconds(attempts)))
+    db.session.execute(update(Job).where(Job.id == job_id).values(**values),
+                       execution_options={"synchronize_session": False})
+
+
+def run_batch(worker_id, batch_size=JOB_BATCH_SIZE):
+    # delivery is at-least-once, so handlers must be idempotent
+    claimed = claim_jobs(worker_id, batch_size)
+    for job_id, kind, payload, attempts, max_attempts, token in claimed:
+        if not _start(job_id, token):
+            continue
+        fn = HANDLERS.get(kind)
+        try:
+            if fn is None:
+                raise LookupError(f"no handler registered for {kind}")
+            fn(json.loads(payload))
+            # marked done in the handler's own transaction, so a crash later in the batch can't rerun it
+            _finish(job_id)
+            db.session.commit()
+        except Exception as exc:
+            db.session.rollback()
+            logger.warning("job %s (%s) failed on attempt %s/%s: %s", job_id, kind, attempts, max_attempts, exc)
+            _fail(job_id, attempts, max_attempts, f"{type(exc).__name__}: {exc}")
+            db.session.commit()
+    return len(claimed)
+
+
+def prune_jobs(days):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    result = db.session.execute(delete(Job).where(Job.status == "done", Job.finished_at < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+
+def queue_counts():
+    rows = db.session.query(Job.status, db.func.count(Job.id)).group_by(Job.status).all()
+    counts = dict.fromkeys(Job.STATUS_CHOICES, 0)
+    counts.update({status: count for status, count in rows})
+    return counts
+
+
+def run_worker(batch_size=JOB_BATCH_SIZE, poll_seconds=JOB_POLL_SECONDS, once=False, retention_days=7):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    last_prune = 0.0
+    while True:
+        processed = run_batch(worker_id, batch_size)
+        if processed:
+            continue
+        if once:
+            return
+        if retention_days and time.monotonic() - last_prune > PRUNE_INTERVAL_SECONDS:
+            prune_jobs(retention_days)
+            last_prune = time.monotonic()
+        time.sleep(poll_seconds)
+
+
+def deliver(recipient, subject, body):
+    # single hook for email/SMS/webhook providers; until one is configured, messages are logged
+    logger.info("notification to=%s subject=%r body=%r", recipient, subject, body)
+
+
+@handler("booking.created")
+def notify_booking_created(payload):
+    booking = db.session.get(Booking, payload["booking_id"])
+    if booking is None:
+        return
+    when = f"{booking.booking_date.strftime('%b %d, %Y')} at {booking.booking_time.strftime('%H:%M')}"
+    deliver(booking.business.owner.email, f"New booking: {booking.service.name}",
+            f"{booking.customer_name} ({booking.customer_phone}) booked {booking.service.name} on {when}.")
+    if booking.customer_email:
+        deliver(booking.customer_email, f"Booking received - {booking.business.name}",
+                f"Your {booking.service.name} booking on {when} is {booking.status}.")
+
+
+@handler("booking.status_changed")
+def notify_booking_status_changed(payload):
+    booking = db.session.get(Booking, payload["booking_id"])
+    if booking is None or not booking.customer_email:
+        return
+    when = f"{booking.booking_date.strftime('%b %d, %Y')} at {booking.booking_time.strftime('%H:%M')}"
+    deliver(booking.customer_email, f"Booking {payload['status']} - {booking.business.name}",
+            f"Your {booking.service.name} booking on {when} is now {payload['status']}.")
+
+
+def init_app(app):
+    import click
+
+    @app.cli.command("run-jobs")
+    @click.option("--batch-size", default=JOB_BATCH_SIZE, show_default=True)
+    @click.option("--poll", "poll_seconds", default=JOB_POLL_SECONDS, show_default=True)
+    @click.option("--once", is_flag=True, help="Drain due jobs and exit.")
+    @click.option("--retention-days", default=7, show_default=True, help="Delete finished jobs older than this.")
+    def run_jobs_command(batch_size, poll_seconds, once, retention_days):
+        logging.basicConfig(level=logging.INFO)
+        try:
+            run_worker(batch_size, poll_seconds, once, retention_days)
+        except KeyboardInterrupt:
+            pass
+        print("Job queue: " + ", ".join(f"{status}={count}" for status, count in queue_counts().items()))
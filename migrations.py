@@ -0,0 +1,244 @@
+import logging
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, bindparam, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from extensions import db
+
+logger = logging.getLogger("melsconnect.migrations")
+
+# Arbitrary key for pg_advisory_xact_lock so concurrent workers upgrade one at a time.
+MIGRATION_LOCK_ID = 74201
+
+version_table = Table(
+    "schema_migrations", MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version):
+    def register(fn):
+        MIGRATIONS.append((version, fn.__name__, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return register
+
+
+def create_indexes(conn, table):
+    for index in table.indexes:
+        index.create(conn, checkfirst=True)
+
+
+@migration(1)
+def add_hot_query_indexes(conn):
+    import models
+    conn.execute(text(
+        "DELETE FROM working_hours WHERE id NOT IN "
+        "(SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM working_hours "
+        "GROUP BY business_id, day_of_week) AS keep)"
+    ))
+    for model in (models.User, models.Business, models.Service, models.WorkingHour, models.Booking):
+        create_indexes(conn, model.__table__)
+
+
+@migration(2)
+def add_booking_counters(conn):
+    import models
+    import stats
+    models.BookingCounter.__table__.create(conn, checkfirst=True)
+    stats.rebuild_counters(conn)
+
+
+def add_column(conn, table, column):
+    if column.name in {existing["name"] for existing in inspect(conn).get_columns(table.name)}:
+        return
+    column_type = column.type.compile(dialect=conn.dialect)
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"
+    if column.server_default is not None:
+        ddl += f" DEFAULT {column.server_default.arg}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    conn.execute(text(ddl))
+
+
+def backfill_booking_durations(conn, batch_size=1000):
+    import models
+    bookings = models.Booking.__table__
+    services = models.Service.__table__
+    updated = 0
+    while True:
+        rows = conn.execute(
+            select(bookings.c.id, bookings.c.booking_date, bookings.c.booking_time, services.c.duration_minutes)
+            .join(services, bookings.c.service_id == services.c.id)
+            .where(bookings.c.duration_minutes.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        conn.execute(
+            bookings.update().where(bookings.c.id == bindparam("booking_id")).values(
+                duration_minutes=bindparam("duration"), end_time=bindparam("ends")
+            ),
+            [{"booking_id": booking_id, "duration": duration,
+              "ends": models.booking_end_time(booking_date, booking_time, duration)}
+             for booking_id, booking_date, booking_time, duration in rows]
+        )
+        updated += len(rows)
+
+
+@migration(3)
+def add_booking_duration_columns(conn):
+    import models
+    table = models.Booking.__table__
+    add_column(conn, table, table.c.duration_minutes)
+    add_column(conn, table, table.c.end_time)
+    backfill_booking_durations(conn)
+    if conn.dialect.name == "postgresql":
+        add_overlap_exclusion(conn)
+
+
+def add_overlap_exclusion(conn):
+    if conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = 'ex_bookings_no_overlap'")).first():
+        return
+    # btree_gist may be unavailable or old data may already overlap;
+    # the advisory lock in reservations still prevents new double bookings.
+    try:
+        with conn.begin_nested():
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS btree_gist"))
+            conn.execute(text(
+                "ALTER TABLE bookings ADD CONSTRAINT ex_bookings_no_overlap EXCLUDE USING gist ("
+                "business_id WITH =, "
+                "tsrange(booking_date + booking_time, booking_date + end_time) WITH &&"
+                ") WHERE (status IN ('pending', 'confirmed'))"
+            ))
+    except DBAPIError as exc:
+        logger.warning("Skipped bookings overlap exclusion constraint: %s", exc.orig)
+
+
+@migration(4)
+def add_business_version_columns(conn):
+    import models
+    table = models.Business.__table__
+    add_column(conn, table, table.c.version)
+    add_column(conn, table, table.c.updated_at)
+    conn.execute(table.update().where(table.c.updated_at.is_(None)).values(updated_at=table.c.created_at))
+
+
+@migration(5)
+def add_jobs_table(conn):
+    import models
+    models.Job.__table__.create(conn, checkfirst=True)
+
+
+@migration(6)
+def add_availability_bitmaps(conn):
+    import models
+    import bitmaps
+    models.AvailabilityBitmap.__table__.create(conn, checkfirst=True)
+    bitmaps.rebuild_bitmaps(conn)
+
+
+@migration(7)
+def add_business_slug_pattern_index(conn):
+    import models
+    if conn.dialect.name == "postgresql":
+        create_indexes(conn, models.Business.__table__)
+
+
+@migration(8)
+def add_daily_rollups(conn):
+    import models
+    import rollups
+    models.DailyServiceRollup.__table__.create(conn, checkfirst=True)
+    models.DailyBusinessRollup.__table__.create(conn, checkfirst=True)
+    bookings = models.Booking.__table__
+    businesses = models.Business.__table__
+    # the full history once; after this the nightly job only revisits a window around today
+    start_date, end_date = rollups.catch_up_window()
+    first_booking = conn.execute(select(db.func.min(bookings.c.booking_date))).scalar()
+    first_business = conn.execute(select(db.func.min(businesses.c.created_at))).scalar()
+    if first_booking is not None:
+        start_date = min(start_date, first_booking)
+    if first_business is not None:
+        start_date = min(start_date, first_business.date())
+    rollups.rebuild_rollups(conn, start_date, end_date)
+    rollups.schedule_nightly(conn)
+
+
+@migration(9)
+def add_business_catalog_version(conn):
+    import models
+    table = models.Business.__table__
+    add_column(conn, table, table.c.catalog_version)
+
+
+@migration(10)
+def add_business_catalog_updated_at(conn):
+    import models
+    table = models.Business.__table__
+    add_column(conn, table, table.c.catalog_updated_at)
+    conn.execute(table.update().where(table.c.catalog_updated_at.is_(None)).values(catalog_updated_at=table.c.updated_at))
+
+
+@migration(11)
+def add_booking_price(conn):
+    import models
+    bookings = models.Booking.__table__
+    services = models.Service.__table__
+    add_column(conn, bookings, bookings.c.price)
+    # today's price is the best guess for history; the rollups were built from it too
+    conn.execute(bookings.update().where(bookings.c.price.is_(None)).values(
+        price=select(services.c.price).where(services.c.id == bookings.c.service_id).scalar_subquery()
+    ))
+
+
+def current_version(conn):
+    if not inspect(conn).has_table(version_table.name):
+        return None
+    return conn.execute(select(db.func.max(version_table.c.version))).scalar()
+
+
+def upgrade(engine=None):
+    import models
+    engine = engine or db.engine
+    applied = []
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+
+        version = current_version(conn)
+        version_table.create(conn, checkfirst=True)
+        if version is None:
+            if not inspect(conn).has_table(models.User.__tablename__):
+                # fresh database: create the current schema, then let every
+                # migration run so non-model DDL (constraints, extensions) applies too
+                db.metadata.create_all(conn)
+            # otherwise the tables were created by the old bare create_all()
+            version = 0
+
+        for number, name, fn in MIGRATIONS:
+            if number <= version:
+                continue
+            fn(conn)
+            conn.execute(version_table.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+            logger.info("Applied migration %s %s", number, name)
+            applied.append(name)
+    return applied
+
+
+def init_app(app):
+    @app.cli.command("backfill-booking-durations")
+    def backfill_booking_durations_command():
+        logging.basicConfig(level=logging.INFO)
+        with db.engine.begin() as conn:
+            updated = backfill_booking_durations(conn)
+        logger.info("Backfilled %s bookings.", updated)
+
+    @app.cli.command("db-upgrade")
+    def db_upgrade_command():
+        logging.basicConfig(level=logging.INFO)
+        if not upgrade():
+            logger.info("Database schema is up to date.")
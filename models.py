@@ -1,11 +1,19 @@
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from slugify import slugify
+from sqlalchemy import and_, case, cast, event, func, literal, or_, select, union_all
+from sqlalchemy.exc import IntegrityError
 from extensions import db
+from passwords import hash_password, needs_rehash, verify_password
+
+SLUG_ATTEMPTS = 5
+SLUG_SUFFIX_DIGITS = 9
 
 class User(UserMixin, db.Model):
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index("ix_users_created_at", "created_at", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -18,10 +26,13 @@ class User(UserMixin, db.Model):
     businesses = db.relationship("Business", back_populates="owner", lazy="dynamic")
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        return needs_rehash(self.password_hash)
     
     @property
     def full_name(self):
@@ -29,6 +40,14 @@ class User(UserMixin, db.Model):
 
 class Business(db.Model):
     __tablename__ = "businesses"
+    __table_args__ = (
+        db.Index("ix_businesses_owner_id", "owner_id"),
+        db.Index("ix_businesses_created_at", "created_at", "id"),
+        # lets LIKE 'prefix%' use an index whatever the database collation;
+        # SQLite's GLOB already uses the unique index on slug
+        db.Index("ix_businesses_slug_pattern", "slug",
+                 postgresql_ops={"slug": "text_pattern_ops"}).ddl_if(dialect="postgresql"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -39,23 +58,59 @@ class Business(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     owner_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # bumped on any change to the business, its services, hours or bookings
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # bumped only when the business, its services or hours change; bookings leave it alone
+    catalog_version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    catalog_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    owner = db.relationship("User", back_populates="businesses")
+    owner = db.relationship("User", back_populates="businesses", lazy="select")
     services = db.relationship("Service", back_populates="business", lazy="dynamic", cascade="all, delete-orphan")
     working_hours = db.relationship("WorkingHour", back_populates="business", lazy="dynamic", cascade="all, delete-orphan")
     bookings = db.relationship("Booking", back_populates="business", lazy="dynamic", cascade="all, delete-orphan")
     
     def generate_slug(self):
+        # the first free slug of base, base-1, base-2, ... picked in one query:
+        # the smallest of 0 and every taken number + 1 that is not itself taken
         base_slug = slugify(self.name)
-        slug = base_slug
-        counter = 1
-        while Business.query.filter_by(slug=slug).first():
-            slug = f"{base_slug}-{counter}"
-            counter += 1
-        self.slug = slug
+        prefix = f"{base_slug}-"
+        suffix = func.substr(Business.slug, len(prefix) + 1)
+        # only suffixes this method could have generated, which also keeps them within int4
+        if db.session.get_bind().dialect.name == "sqlite":
+            numbered = and_(Business.slug.op("GLOB")(f"{prefix}[1-9]*"), suffix.op("NOT GLOB")("*[^0-9]*"),
+                            func.length(suffix) <= SLUG_SUFFIX_DIGITS)
+        else:
+            numbered = and_(Business.slug.like(f"{prefix}%"),
+                            suffix.regexp_match(f"^[1-9][0-9]{{0,{SLUG_SUFFIX_DIGITS - 1}}}$"))
+        taken = select(
+            case((Business.slug == base_slug, 0), else_=cast(suffix, db.Integer)).label("number")
+        ).where(or_(Business.slug == base_slug, numbered)).cte("taken")
+        candidates = union_all(select(literal(0).label("number")), select((taken.c.number + 1).label("number"))).subquery()
+        free = db.session.execute(
+            select(func.min(candidates.c.number)).where(candidates.c.number.not_in(select(taken.c.number)))
+        ).scalar()
+        self.slug = base_slug if free == 0 else f"{base_slug}-{free}"
+
+    def insert_with_unique_slug(self, attempts=SLUG_ATTEMPTS):
+        # two creations can pick the same suffix; the unique constraint rejects
+        # the loser, which recomputes its slug and tries again
+        for attempt in range(attempts):
+            self.generate_slug()
+            db.session.add(self)
+            try:
+                db.session.commit()
+                return
+            except IntegrityError:
+                db.session.rollback()
+                if attempt + 1 == attempts:
+                    raise
 
 class Service(db.Model):
     __tablename__ = "services"
+    __table_args__ = (
+        db.Index("ix_services_business_active", "business_id", "is_active"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     business_id = db.Column(db.Integer, db.ForeignKey("businesses.id"), nullable=False)
@@ -66,11 +121,14 @@ class Service(db.Model):
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    business = db.relationship("Business", back_populates="services")
+    business = db.relationship("Business", back_populates="services", lazy="select")
     bookings = db.relationship("Booking", back_populates="service", lazy="dynamic")
 
 class WorkingHour(db.Model):
     __tablename__ = "working_hours"
+    __table_args__ = (
+        db.Index("uq_working_hours_business_day", "business_id", "day_of_week", unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     business_id = db.Column(db.Integer, db.ForeignKey("businesses.id"), nullable=False)
@@ -89,6 +147,11 @@ class WorkingHour(db.Model):
 
 class Booking(db.Model):
     __tablename__ = "bookings"
+    __table_args__ = (
+        db.Index("ix_bookings_business_date_status", "business_id", "booking_date", "status"),
+        db.Index("ix_bookings_business_status", "business_id", "status"),
+        db.Index("ix_bookings_created_at", "created_at", "id"),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     business_id = db.Column(db.Integer, db.ForeignKey("businesses.id"), nullable=False)
@@ -100,16 +163,99 @@ class Booking(db.Model):
     booking_time = db.Column(db.Time, nullable=False)
     status = db.Column(db.String(20), default="pending")
     notes = db.Column(db.Text)
+    # copied from the service at booking time so later service edits don't change history
+    duration_minutes = db.Column(db.Integer)
+    price = db.Column(db.Numeric(10, 2))
+    end_time = db.Column(db.Time)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    business = db.relationship("Business", back_populates="bookings")
-    service = db.relationship("Service", back_populates="bookings")
+    business = db.relationship("Business", back_populates="bookings", lazy="select")
+    # every booking view shows its service, so always fetch it in the same SELECT
+    service = db.relationship("Service", back_populates="bookings", lazy="joined", innerjoin=True)
     
     STATUS_CHOICES = ["pending", "confirmed", "cancelled", "completed"]
     
-    @property
-    def end_time(self):
-        from datetime import datetime, timedelta
-        start_dt = datetime.combine(self.booking_date, self.booking_time)
-        end_dt = start_dt + timedelta(minutes=self.service.duration_minutes)
-        return end_dt.time()
+    def set_duration(self, duration_minutes):
+        self.duration_minutes = duration_minutes
+        self.end_time = booking_end_time(self.booking_date, self.booking_time, duration_minutes)
+
+def booking_end_time(booking_date, booking_time, duration_minutes):
+    end_dt = datetime.combine(booking_date, booking_time) + timedelta(minutes=duration_minutes)
+    if end_dt.date() != booking_date:
+        return time.max
+    return end_dt.time()
+
+@event.listens_for(Booking, "before_insert")
+def _fill_booking_duration(mapper, connection, target):
+    if target.duration_minutes is None or target.price is None:
+        duration, price = connection.execute(
+            select(Service.duration_minutes, Service.price).where(Service.id == target.service_id)
+        ).one()
+        if target.duration_minutes is None:
+            target.set_duration(duration)
+        if target.price is None:
+            target.price = price
+
+class BookingCounter(db.Model):
+    __tablename__ = "booking_counters"
+    
+    business_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        db.Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+    
+    STATUS_CHOICES = ["queued", "running", "done", "failed"]
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class AvailabilityBitmap(db.Model):
+    __tablename__ = "availability_bitmaps"
+    
+    business_id = db.Column(db.Integer, primary_key=True)
+    booking_date = db.Column(db.Date, primary_key=True)
+    occupied = db.Column(db.LargeBinary(36), nullable=False)
+
+class DailyServiceRollup(db.Model):
+    __tablename__ = "daily_service_rollups"
+    
+    business_id = db.Column(db.Integer, primary_key=True)
+    rollup_date = db.Column(db.Date, primary_key=True)
+    service_id = db.Column(db.Integer, primary_key=True)
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    confirmed_count = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    booked_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyBusinessRollup(db.Model):
+    __tablename__ = "daily_business_rollups"
+    __table_args__ = (
+        db.Index("ix_daily_business_rollups_date", "rollup_date"),
+    )
+    
+    business_id = db.Column(db.Integer, primary_key=True)
+    rollup_date = db.Column(db.Date, primary_key=True)
+    pending_count = db.Column(db.Integer, nullable=False, default=0)
+    confirmed_count = db.Column(db.Integer, nullable=False, default=0)
+    cancelled_count = db.Column(db.Integer, nullable=False, default=0)
+    completed_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    booked_minutes = db.Column(db.Integer, nullable=False, default=0)
+    open_minutes = db.Column(db.Integer, nullable=False, default=0)
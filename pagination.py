@@ -0,0 +1,94 @@
+import base64
+import json
+from datetime import date, datetime, time
+from flask import request, url_for
+from sqlalchemy import tuple_
+
+DEFAULT_PER_PAGE = 50
+
+
+def encode_cursor(values):
+    raw = json.dumps([value.isoformat() if hasattr(value, "isoformat") else value for value in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, columns):
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = []
+        for column, value in zip(columns, raw, strict=True):
+            python_type = column.type.python_type
+            if python_type in (date, datetime, time):
+                value = python_type.fromisoformat(value)
+            elif python_type is int:
+                value = int(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.next_url = None
+        self.prev_url = None
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def paginate_keyset(query, columns, after=None, before=None, per_page=DEFAULT_PER_PAGE):
+    # Listings are newest first, so every key column is sorted descending and
+    # the last column must be unique (the primary key).
+    key = tuple_(*columns)
+    before_values = decode_cursor(before, columns) if before else None
+    after_values = decode_cursor(after, columns) if after else None
+
+    if before_values:
+        query = query.filter(key > tuple_(*before_values)).order_by(*[column.asc() for column in columns])
+    else:
+        if after_values:
+            query = query.filter(key < tuple_(*after_values))
+        query = query.order_by(*[column.desc() for column in columns])
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if before_values:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, bool(after_values)
+
+    if not rows:
+        return KeysetPage(rows)
+
+    def cursor_for(row):
+        return encode_cursor([getattr(row, column.key) for column in columns])
+
+    return KeysetPage(
+        rows,
+        next_cursor=cursor_for(rows[-1]) if has_next else None,
+        prev_cursor=cursor_for(rows[0]) if has_prev else None
+    )
+
+
+def paginate_request(query, columns, per_page=DEFAULT_PER_PAGE):
+    page = paginate_keyset(query, columns, after=request.args.get("after"),
+                           before=request.args.get("before"), per_page=per_page)
+    args = {k: v for k, v in request.args.items() if k not in ("after", "before")}
+    args.update(request.view_args or {})
+    if page.has_next:
+        page.next_url = url_for(request.endpoint, after=page.next_cursor, **args)
+    if page.has_prev:
+        page.prev_url = url_for(request.endpoint, before=page.prev_cursor, **args)
+    return page
@@ -0,0 +1,76 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# werkzeug method strings, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000"
+DEFAULT_HASH_METHOD = "scrypt"
+# pending hash jobs allowed per pool process before callers are turned away
+POOL_QUEUE_FACTOR = 2
+POOL_WAIT_SECONDS = 5
+
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+class HashingBusy(RuntimeError):
+    pass
+
+
+def _config(key, default):
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def hash_method():
+    return _config("PASSWORD_HASH_METHOD", DEFAULT_HASH_METHOD)
+
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # werkzeug fills in default cost parameters, so read them back from a real hash
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def needs_rehash(password_hash):
+    return password_hash.split("$", 1)[0] != _method_prefix(hash_method())
+
+
+def _get_pool(workers):
+    global _pool, _pool_pid, _pool_slots
+    with _pool_lock:
+        # created lazily in each process, so a pool is never inherited across a fork
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_pid = os.getpid()
+            _pool_slots = threading.BoundedSemaphore(workers * POOL_QUEUE_FACTOR)
+        return _pool, _pool_slots
+
+
+def _run(fn, *args):
+    workers = _config("PASSWORD_HASH_WORKERS", 0)
+    if not workers:
+        return fn(*args)
+    pool, slots = _get_pool(workers)
+    if not slots.acquire(timeout=POOL_WAIT_SECONDS):
+        raise HashingBusy("password hashing pool is saturated")
+    try:
+        return pool.submit(fn, *args).result()
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, hash_method())
+
+
+def verify_password(password_hash, password):
+    return _run(check_password_hash, password_hash, password)
+
+
+def init_app(app):
+    app.config.setdefault("PASSWORD_HASH_METHOD", DEFAULT_HASH_METHOD)
+    app.config.setdefault("PASSWORD_HASH_WORKERS", 0)
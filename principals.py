@@ -0,0 +1,55 @@
+from typing import NamedTuple
+from cache import MemoryBackend, TenantCache
+from models import User
+
+PRINCIPAL_CACHE_MAX_ENTRIES = 10000
+# Bounds how long another worker keeps serving a demoted admin or renamed user.
+PRINCIPAL_CACHE_TTL_SECONDS = 60
+
+principal_cache = TenantCache("principal", MemoryBackend(max_entries=PRINCIPAL_CACHE_MAX_ENTRIES,
+                                                         ttl=PRINCIPAL_CACHE_TTL_SECONDS))
+
+
+class Principal(NamedTuple):
+    # what request handling needs from the logged-in user; views that change
+    # the account load the User row explicitly
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    is_admin: bool
+
+    @property
+    def full_name(self):
+        return f"{self.first_name} {self.last_name}"
+
+    @property
+    def is_active(self):
+        return True
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    def get_id(self):
+        return str(self.id)
+
+
+def build_principal(user_id):
+    row = User.query.with_entities(User.id, User.email, User.first_name, User.last_name,
+                                   User.is_admin).filter_by(id=user_id).first()
+    if row is None:
+        return None
+    return Principal(row.id, row.email, row.first_name, row.last_name, bool(row.is_admin))
+
+
+def load_principal(user_id):
+    return principal_cache.get_or_compute(user_id, (), lambda: build_principal(user_id))
+
+
+def invalidate_principal(user_id):
+    principal_cache.invalidate(user_id)
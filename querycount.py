@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from extensions import db
+
+# Queries each listing route may issue regardless of how many rows it renders,
+# including the session's user load when the principal cache is cold.
+LISTING_QUERY_LIMITS = {
+    "/b/<slug>/": 4,
+    "/b/<slug>/ (warm)": 0,
+    "/admin/": 5,
+    "/admin/users": 2,
+    "/admin/businesses": 2,
+    "/admin/bookings": 3,
+    "/dashboard/": 5,
+    "/dashboard/bookings": 3,
+}
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(app):
+    with app.app_context():
+        engine = db.engine
+    counter = QueryCounter()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def assert_max_queries(client, url, limit=None):
+    if limit is None:
+        limit = LISTING_QUERY_LIMITS[url]
+    with count_queries(client.application) as counter:
+        response = client.get(url)
+    assert response.status_code == 200, f"GET {url} returned {response.status_code}"
+    if counter.count > limit:
+        statements = "\n".join(counter.statements)
+        raise AssertionError(f"GET {url} issued {counter.count} queries, limit is {limit}:\n{statements}")
+    return counter
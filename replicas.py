@@ -0,0 +1,83 @@
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Select
+
+REPLICA_BIND = "replica"
+READ_YOUR_WRITES_SECONDS = 10
+# stored in the user's session cookie, so the window follows them across workers
+PRIMARY_UNTIL_KEY = "_primary_until"
+
+
+def replica_reads(view):
+    # marks a GET view whose plain SELECTs may be served by the replica
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        g.replica_reads = True
+        return view(*args, **kwargs)
+    return decorated_function
+
+
+def replica_configured():
+    return REPLICA_BIND in (current_app.config.get("SQLALCHEMY_BINDS") or {})
+
+
+def use_replica():
+    if not has_request_context() or not g.get("replica_reads") or request.method not in ("GET", "HEAD"):
+        return False
+    return replica_configured() and session.get(PRIMARY_UNTIL_KEY, 0) < time.time()
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # flushes, locking reads and non-SELECT statements always go to the primary
+        if (bind is None and not self._flushing and isinstance(clause, Select)
+                and clause._for_update_arg is None and use_replica()):
+            return self._db.engines[REPLICA_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _note_primary_write(conn, cursor, statement, parameters, context, executemany):
+    # any INSERT/UPDATE/DELETE, not just ORM flushes: bulk imports, counter and
+    # rollup upserts and job updates are Core statements; only the primary takes writes
+    if has_request_context() and context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        g.wrote_primary = True
+
+
+def copy_sqlite_database(source, target):
+    source_connection = source.raw_connection()
+    target_connection = target.raw_connection()
+    try:
+        source_connection.driver_connection.backup(target_connection.driver_connection)
+    finally:
+        target_connection.close()
+        source_connection.close()
+
+
+def init_app(app):
+    import click
+    from extensions import db
+
+    app.config.setdefault("READ_YOUR_WRITES_SECONDS", READ_YOUR_WRITES_SECONDS)
+
+    @app.after_request
+    def start_read_your_writes_window(response):
+        # the user's next pages read from the primary until the replica has caught up
+        if g.get("wrote_primary") and replica_configured():
+            session[PRIMARY_UNTIL_KEY] = time.time() + app.config["READ_YOUR_WRITES_SECONDS"]
+        return response
+
+    @app.cli.command("sync-replica")
+    def sync_replica_command():
+        # stands in for replication when the primary and replica are local SQLite files
+        if not replica_configured():
+            raise click.ClickException("DATABASE_REPLICA_URL is not set.")
+        primary, replica = db.engines[None], db.engines[REPLICA_BIND]
+        if primary.dialect.name != "sqlite" or replica.dialect.name != "sqlite":
+            raise click.ClickException("sync-replica only copies SQLite databases; use database replication otherwise.")
+        copy_sqlite_database(primary, replica)
+        print("Copied the primary database to the replica.")
@@ -0,0 +1,90 @@
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from extensions import db
+from models import Business, Booking
+from availability import ACTIVE_STATUSES, find_overlapping_booking, invalidate_availability, is_slot_available
+from jobs import enqueue, enqueue_status_change
+
+
+def _lock_business_day(dialect, business_id, booking_date):
+    if dialect == "postgresql":
+        # released automatically when the transaction ends
+        db.session.execute(text("SELECT pg_advisory_xact_lock(:business_id, :day)"),
+                           {"business_id": business_id, "day": booking_date.toordinal()})
+    else:
+        db.session.query(Business.id).filter(Business.id == business_id).with_for_update().one()
+
+
+def lock_business_days(business_id, booking_dates):
+    # in date order, so two writers locking overlapping sets of days can't deadlock;
+    # elsewhere one row lock on the business covers every day
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "sqlite" or not booking_dates:
+        return
+    for booking_date in sorted(booking_dates) if dialect == "postgresql" else [min(booking_dates)]:
+        _lock_business_day(dialect, business_id, booking_date)
+
+
+def reserve_booking(business, service, booking_date, slot, **fields):
+    booking = Booking(
+        business_id=business.id,
+        service_id=service.id,
+        booking_date=booking_date,
+        booking_time=datetime.strptime(slot, "%H:%M").time(),
+        status="pending",
+        price=service.price,
+        **fields
+    )
+    booking.set_duration(service.duration_minutes)
+    dialect = db.session.get_bind().dialect.name
+    try:
+        if dialect == "sqlite":
+            # SQLite allows one writer at a time: once our row is flushed we hold
+            # the write lock, so a competing insert waits and then sees our row.
+            db.session.add(booking)
+            db.session.flush()
+            available = is_slot_available(business, service, booking_date, slot, exclude_booking_id=booking.id)
+        else:
+            _lock_business_day(dialect, business.id, booking_date)
+            available = is_slot_available(business, service, booking_date, slot)
+            if available:
+                db.session.add(booking)
+                db.session.flush()
+        if not available:
+            db.session.rollback()
+            return None
+        enqueue("booking.created", {"booking_id": booking.id})
+        db.session.commit()
+    except (OperationalError, IntegrityError):
+        # SQLite gives up with "database is locked" once the busy timeout expires;
+        # on PostgreSQL the overlap exclusion constraint is the last line of defence
+        db.session.rollback()
+        return None
+    invalidate_availability(business.id)
+    return booking
+
+
+def change_booking_status(booking, status):
+    # putting a cancelled or completed booking back on the calendar goes through
+    # the same day lock and overlap check as a new booking
+    previous_status = booking.status
+    reactivating = status in ACTIVE_STATUSES and previous_status not in ACTIVE_STATUSES
+    dialect = db.session.get_bind().dialect.name
+    try:
+        if reactivating and dialect != "sqlite":
+            _lock_business_day(dialect, booking.business_id, booking.booking_date)
+        booking.status = status
+        if reactivating:
+            db.session.flush()
+            if find_overlapping_booking(booking.business_id, booking.booking_date, booking.booking_time,
+                                        booking.end_time, exclude_booking_id=booking.id) is not None:
+                db.session.rollback()
+                return False
+        enqueue_status_change(booking, previous_status)
+        db.session.commit()
+    except (OperationalError, IntegrityError):
+        db.session.rollback()
+        return False
+    invalidate_availability(booking.business_id)
+    return True
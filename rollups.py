@@ -0,0 +1,386 @@
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import case, delete, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models import Business, Service, WorkingHour, Booking, Job, DailyServiceRollup, DailyBusinessRollup
+from availability import to_minutes
+from jobs import enqueue, handler
+
+# Per-business, per-service, per-day aggregates behind the report pages.
+# A booking write adds its change onto its rows in the same transaction; the
+# nightly job recomputes a window around today, which also picks up edits
+# to working hours and corrects any drift. Revenue is always the price stored
+# on the booking, so a later service price edit changes neither.
+STATUS_COLUMNS = {
+    "pending": "pending_count",
+    "confirmed": "confirmed_count",
+    "cancelled": "cancelled_count",
+    "completed": "completed_count",
+}
+SUMMED_COLUMNS = tuple(STATUS_COLUMNS.values()) + ("revenue", "booked_minutes")
+# statuses that take up the calendar, and statuses that are paid for
+BOOKED_STATUSES = ("pending", "confirmed", "completed")
+REVENUE_STATUSES = ("confirmed", "completed")
+CATCH_UP_DAYS = 7
+HORIZON_DAYS = 60
+NIGHTLY_HOUR = 2
+NIGHTLY_JOB = "rollups.nightly"
+ROLLUP_INSERT_BATCH = 1000
+REPORT_DAYS = 30
+REPORT_MAX_DAYS = 366
+ADMIN_REPORT_LIMIT = 100
+
+
+def catch_up_window(today=None):
+    today = today or date.today()
+    return today - timedelta(days=CATCH_UP_DAYS), today + timedelta(days=HORIZON_DAYS)
+
+
+def open_minutes_by_weekday(connection, business_id=None):
+    hours = WorkingHour.__table__
+    query = select(hours.c.business_id, hours.c.day_of_week, hours.c.open_time, hours.c.close_time, hours.c.is_closed)
+    if business_id is not None:
+        query = query.where(hours.c.business_id == business_id)
+    weekdays = {}
+    for row_business_id, day_of_week, open_time, close_time, is_closed in connection.execute(query):
+        minutes = 0 if is_closed else max(0, to_minutes(close_time) - to_minutes(open_time))
+        weekdays.setdefault(row_business_id, [0] * 7)[day_of_week] = minutes
+    return weekdays
+
+
+def _service_day_totals(connection, start_date, end_date, business_id=None):
+    bookings = Booking.__table__
+    services = Service.__table__
+    status = func.coalesce(bookings.c.status, "pending")
+    query = select(
+        bookings.c.business_id,
+        bookings.c.booking_date,
+        bookings.c.service_id,
+        *[func.sum(case((status == name, 1), else_=0)).label(column) for name, column in STATUS_COLUMNS.items()],
+        func.sum(case((status.in_(REVENUE_STATUSES), func.coalesce(bookings.c.price, services.c.price)),
+                      else_=0)).label("revenue"),
+        func.sum(case((status.in_(BOOKED_STATUSES),
+                       func.coalesce(bookings.c.duration_minutes, services.c.duration_minutes)), else_=0)).label("booked_minutes"),
+    ).join(services, services.c.id == bookings.c.service_id).where(
+        bookings.c.booking_date >= start_date,
+        bookings.c.booking_date <= end_date
+    ).group_by(bookings.c.business_id, bookings.c.booking_date, bookings.c.service_id)
+    if business_id is not None:
+        query = query.where(bookings.c.business_id == business_id)
+    return connection.execute(query).all()
+
+
+def _write(connection, table, rows):
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        # an upsert, so a booking refresh racing the nightly rebuild can't fail it on the primary key
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={column.name: stmt.excluded[column.name] for column in table.columns if not column.primary_key}
+        )
+    else:
+        stmt = table.insert()
+    for offset in range(0, len(rows), ROLLUP_INSERT_BATCH):
+        connection.execute(stmt, rows[offset:offset + ROLLUP_INSERT_BATCH])
+
+
+def rebuild_rollups(connection, start_date, end_date, business_id=None):
+    # recomputes every business-day in the range from the bookings themselves,
+    # so a missed or doubled refresh can never leave a drifting total behind
+    service_table = DailyServiceRollup.__table__
+    business_table = DailyBusinessRollup.__table__
+    for table in (service_table, business_table):
+        clear = delete(table).where(table.c.rollup_date >= start_date, table.c.rollup_date <= end_date)
+        if business_id is not None:
+            clear = clear.where(table.c.business_id == business_id)
+        connection.execute(clear)
+
+    service_rows = []
+    days = {}
+    for row in _service_day_totals(connection, start_date, end_date, business_id):
+        values = {column: row._mapping[column] or 0 for column in SUMMED_COLUMNS}
+        service_rows.append(dict(values, business_id=row.business_id, rollup_date=row.booking_date,
+                                 service_id=row.service_id))
+        day = days.setdefault((row.business_id, row.booking_date), dict.fromkeys(SUMMED_COLUMNS, 0))
+        for column in SUMMED_COLUMNS:
+            day[column] += values[column]
+
+    # open minutes count from the day the business was created, so utilization
+    # isn't diluted by hours it was never taking bookings for
+    businesses = Business.__table__
+    query = select(businesses.c.id, businesses.c.created_at)
+    if business_id is not None:
+        query = query.where(businesses.c.id == business_id)
+    weekdays = open_minutes_by_weekday(connection, business_id)
+    business_rows = []
+    for row_business_id, created_at in connection.execute(query):
+        hours = weekdays.get(row_business_id, [0] * 7)
+        current = max(start_date, created_at.date()) if created_at else start_date
+        while current <= end_date:
+            day = days.pop((row_business_id, current), None)
+            if day is not None or hours[current.weekday()]:
+                business_rows.append(dict(day or dict.fromkeys(SUMMED_COLUMNS, 0), business_id=row_business_id,
+                                          rollup_date=current, open_minutes=hours[current.weekday()]))
+            current += timedelta(days=1)
+    # bookings dated before the business was created (e.g. imported history)
+    for (row_business_id, current), day in days.items():
+        business_rows.append(dict(day, business_id=row_business_id, rollup_date=current, open_minutes=0))
+
+    if service_rows:
+        _write(connection, service_table, service_rows)
+    if business_rows:
+        _write(connection, business_table, business_rows)
+    return len(business_rows)
+
+
+def add_booking(deltas, booking_date, service_id, status, minutes, price, sign=1):
+    # one booking's share of its rows, the same rules _service_day_totals aggregates with
+    status = status or "pending"
+    values = deltas.setdefault((booking_date, service_id), dict.fromkeys(SUMMED_COLUMNS, 0))
+    if status in STATUS_COLUMNS:
+        values[STATUS_COLUMNS[status]] += sign
+    if status in REVENUE_STATUSES:
+        values["revenue"] += sign * (price or 0)
+    if status in BOOKED_STATUSES:
+        values["booked_minutes"] += sign * (minutes or 0)
+
+
+def _add(connection, table, rows):
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={column: table.c[column] + stmt.excluded[column] for column in SUMMED_COLUMNS}
+        )
+        connection.execute(stmt, rows)
+        return
+    for row in rows:
+        key = [column == row[column.name] for column in table.primary_key.columns]
+        result = connection.execute(update(table).where(*key).values(
+            {column: table.c[column] + row[column] for column in SUMMED_COLUMNS}
+        ))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+def adjust_rollups(connection, business_id, deltas):
+    # deltas: {(rollup_date, service_id): {column: change}} from add_booking. Rows a
+    # delta creates start with no open minutes; the next rebuild of the day fills them in
+    service_rows = []
+    days = {}
+    for (rollup_date, service_id), values in deltas.items():
+        if not any(values.values()):
+            continue
+        service_rows.append(dict(values, business_id=business_id, rollup_date=rollup_date, service_id=service_id))
+        day = days.setdefault(rollup_date, dict.fromkeys(SUMMED_COLUMNS, 0))
+        for column in SUMMED_COLUMNS:
+            day[column] += values[column]
+    if service_rows:
+        _add(connection, DailyServiceRollup.__table__, service_rows)
+        _add(connection, DailyBusinessRollup.__table__,
+             [dict(values, business_id=business_id, rollup_date=rollup_date) for rollup_date, values in days.items()])
+
+
+def _service_costs(connection, target, *bookings):
+    # (price, duration) of the services of (service_id, duration, price) bookings
+    # missing either, for rows from before bookings stored them. Taken from the
+    # session when the request already loaded the service, so only unseen services cost a query
+    service_ids = {service_id for service_id, duration, price in bookings if duration is None or price is None}
+    costs = {}
+    session = inspect(target).session
+    for service_id in service_ids:
+        service = session.identity_map.get(session.identity_key(Service, service_id)) if session else None
+        if service is not None and {"price", "duration_minutes"} <= inspect(service).dict.keys():
+            costs[service_id] = (service.price, service.duration_minutes)
+    missing = service_ids - costs.keys()
+    if missing:
+        services = Service.__table__
+        costs.update((row.id, (row.price, row.duration_minutes)) for row in connection.execute(
+            select(services.c.id, services.c.price, services.c.duration_minutes).where(services.c.id.in_(missing))
+        ))
+    return costs
+
+
+def _add_target(deltas, costs, booking_date, service_id, status, duration, price, sign):
+    # the same fallbacks to the service as _service_day_totals
+    service_price, service_minutes = costs.get(service_id, (0, 0))
+    add_booking(deltas, booking_date, service_id, status, duration if duration is not None else service_minutes,
+                price if price is not None else service_price, sign)
+
+
+def _previous(state, name):
+    history = state.attrs[name].history
+    return history.deleted[0] if history.deleted else state.attrs[name].value
+
+
+@event.listens_for(Booking.booking_date, "set", active_history=True)
+@event.listens_for(Booking.service_id, "set", active_history=True)
+@event.listens_for(Booking.duration_minutes, "set", active_history=True)
+@event.listens_for(Booking.price, "set", active_history=True)
+def _load_previous_values(target, value, oldvalue, initiator):
+    # active_history makes the old values available to after_update even when expired
+    pass
+
+
+@event.listens_for(Booking, "after_insert")
+def _add_inserted_booking(mapper, connection, target):
+    deltas = {}
+    costs = _service_costs(connection, target, (target.service_id, target.duration_minutes, target.price))
+    _add_target(deltas, costs, target.booking_date, target.service_id, target.status, target.duration_minutes,
+                target.price, 1)
+    adjust_rollups(connection, target.business_id, deltas)
+
+
+@event.listens_for(Booking, "after_update")
+def _move_updated_booking(mapper, connection, target):
+    state = inspect(target)
+    names = ("status", "booking_date", "service_id", "duration_minutes", "price")
+    if not any(state.attrs[name].history.has_changes() for name in names):
+        return
+    old = {name: _previous(state, name) for name in names}
+    deltas = {}
+    costs = _service_costs(connection, target, (old["service_id"], old["duration_minutes"], old["price"]),
+                           (target.service_id, target.duration_minutes, target.price))
+    _add_target(deltas, costs, old["booking_date"], old["service_id"], old["status"], old["duration_minutes"],
+                old["price"], -1)
+    _add_target(deltas, costs, target.booking_date, target.service_id, target.status, target.duration_minutes,
+                target.price, 1)
+    adjust_rollups(connection, target.business_id, deltas)
+
+
+@event.listens_for(Booking, "after_delete")
+def _remove_deleted_booking(mapper, connection, target):
+    deltas = {}
+    costs = _service_costs(connection, target, (target.service_id, target.duration_minutes, target.price))
+    _add_target(deltas, costs, target.booking_date, target.service_id, target.status, target.duration_minutes,
+                target.price, -1)
+    adjust_rollups(connection, target.business_id, deltas)
+
+
+def next_nightly_run(now=None):
+    now = now or datetime.utcnow()
+    run_at = datetime.combine(now.date(), time(NIGHTLY_HOUR))
+    return run_at if run_at > now else run_at + timedelta(days=1)
+
+
+def schedule_nightly(connection):
+    # each run queues the next one; the check keeps a retry from forking the chain
+    jobs = Job.__table__
+    queued = connection.execute(
+        select(jobs.c.id).where(jobs.c.kind == NIGHTLY_JOB, jobs.c.status == "queued").limit(1)
+    ).first()
+    if queued is None:
+        connection.execute(jobs.insert().values(kind=NIGHTLY_JOB, run_at=next_nightly_run()))
+        return True
+    return False
+
+
+def enqueue_business_refresh(business_id):
+    # working hours apply to every day in the window, so that is rebuilt off the request
+    enqueue("rollups.business", {"business_id": business_id})
+
+
+@handler(NIGHTLY_JOB)
+def run_nightly_rollups(payload):
+    # the next run is queued first and committed on its own, so a failed rebuild doesn't end the chain
+    with db.engine.begin() as connection:
+        schedule_nightly(connection)
+    start_date, end_date = catch_up_window()
+    rebuild_rollups(db.session.connection(), start_date, end_date)
+
+
+@handler("rollups.business")
+def refresh_business_rollups(payload):
+    start_date, end_date = catch_up_window()
+    rebuild_rollups(db.session.connection(), start_date, end_date, payload["business_id"])
+
+
+def _summed(model):
+    columns = SUMMED_COLUMNS + ("open_minutes",) if model is DailyBusinessRollup else SUMMED_COLUMNS
+    return [func.coalesce(func.sum(getattr(model, column)), 0).label(column) for column in columns]
+
+
+def _report_row(row):
+    values = dict(row._mapping)
+    values["booking_count"] = sum(values[column] for column in STATUS_COLUMNS.values())
+    open_minutes = values.get("open_minutes")
+    values["utilization"] = values["booked_minutes"] / open_minutes if open_minutes else None
+    return values
+
+
+def business_report(business_id, start_date, end_date):
+    in_range = (DailyBusinessRollup.business_id == business_id,
+                DailyBusinessRollup.rollup_date >= start_date,
+                DailyBusinessRollup.rollup_date <= end_date)
+    totals = _report_row(db.session.execute(select(*_summed(DailyBusinessRollup)).where(*in_range)).one())
+    days = [_report_row(row) for row in db.session.execute(
+        select(DailyBusinessRollup.rollup_date, *[getattr(DailyBusinessRollup, column) for column in SUMMED_COLUMNS],
+               DailyBusinessRollup.open_minutes).where(*in_range).order_by(DailyBusinessRollup.rollup_date)
+    ).all()]
+    services = [_report_row(row) for row in db.session.execute(
+        select(DailyServiceRollup.service_id, Service.name, *_summed(DailyServiceRollup))
+        .join(Service, Service.id == DailyServiceRollup.service_id)
+        .where(DailyServiceRollup.business_id == business_id,
+               DailyServiceRollup.rollup_date >= start_date,
+               DailyServiceRollup.rollup_date <= end_date)
+        .group_by(DailyServiceRollup.service_id, Service.name)
+        .order_by(func.sum(DailyServiceRollup.revenue).desc(), Service.name)
+    ).all()]
+    return {"totals": totals, "services": services, "days": days}
+
+
+def admin_report(start_date, end_date, limit=ADMIN_REPORT_LIMIT):
+    in_range = (DailyBusinessRollup.rollup_date >= start_date, DailyBusinessRollup.rollup_date <= end_date)
+    totals = _report_row(db.session.execute(select(*_summed(DailyBusinessRollup)).where(*in_range)).one())
+    businesses = [_report_row(row) for row in db.session.execute(
+        select(DailyBusinessRollup.business_id, Business.name, Business.slug, *_summed(DailyBusinessRollup))
+        .join(Business, Business.id == DailyBusinessRollup.business_id)
+        .where(*in_range)
+        .group_by(DailyBusinessRollup.business_id, Business.name, Business.slug)
+        .order_by(func.sum(DailyBusinessRollup.revenue).desc(), Business.name)
+        .limit(limit)
+    ).all()]
+    return {"totals": totals, "businesses": businesses}
+
+
+def report_range(args, today=None):
+    today = today or date.today()
+    try:
+        end_date = date.fromisoformat(args.get("to", ""))
+    except ValueError:
+        end_date = today
+    try:
+        start_date = date.fromisoformat(args.get("from", ""))
+    except ValueError:
+        start_date = end_date - timedelta(days=REPORT_DAYS - 1)
+    if start_date > end_date:
+        start_date, end_date = end_date, start_date
+    return max(start_date, end_date - timedelta(days=REPORT_MAX_DAYS - 1)), end_date
+
+
+def init_app(app):
+    import click
+
+    @app.cli.command("refresh-rollups")
+    @click.option("--business", "slug", default=None, help="Only rebuild this business.")
+    @click.option("--days-back", default=CATCH_UP_DAYS, show_default=True, help="Rebuild this many days before today.")
+    @click.option("--schedule", is_flag=True, help="Queue the nightly job if none is queued.")
+    def refresh_rollups_command(slug, days_back, schedule):
+        business_id = None
+        if slug:
+            business = Business.query.filter_by(slug=slug).first()
+            if not business:
+                raise click.ClickException(f"No business with slug '{slug}'.")
+            business_id = business.id
+        today = date.today()
+        with db.engine.begin() as connection:
+            days = rebuild_rollups(connection, today - timedelta(days=days_back),
+                                   today + timedelta(days=HORIZON_DAYS), business_id)
+            scheduled = schedule and schedule_nightly(connection)
+        print(f"Rebuilt rollups for {days} business-days.")
+        if scheduled:
+            print(f"Queued the nightly rollup job for {next_nightly_run():%Y-%m-%d %H:%M} UTC.")
@@ -1,10 +1,19 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, jsonify
 from flask_login import login_required, current_user
 from functools import wraps
 from datetime import datetime
+from sqlalchemy.orm import joinedload
 from extensions import db
 from models import User, Business, Service, WorkingHour, Booking
 from forms import AdminBusinessForm, AdminUserForm
+from availability import availability_cache
+from tenants import tenant_cache, invalidate_tenant
+from fragments import fragment_cache
+from principals import principal_cache, invalidate_principal
+from pagination import paginate_request
+from replicas import replica_reads
+from stats import admin_dashboard_stats
+from rollups import admin_report, enqueue_business_refresh, report_range
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -19,29 +28,20 @@ def admin_required(f):
 @admin_bp.route("/")
 @login_required
 @admin_required
+@replica_reads
 def dashboard():
-    total_businesses = Business.query.count()
-    active_businesses = Business.query.filter_by(is_active=True).count()
-    total_users = User.query.count()
-    total_bookings = Booking.query.count()
-    pending_bookings = Booking.query.filter_by(status="pending").count()
+    stats = admin_dashboard_stats()
+    recent_bookings = Booking.query.options(joinedload(Booking.business)).order_by(Booking.created_at.desc()).limit(10).all()
     
-    recent_bookings = Booking.query.order_by(Booking.created_at.desc()).limit(10).all()
-    
-    return render_template("admin/dashboard.html",
-                         total_businesses=total_businesses,
-                         active_businesses=active_businesses,
-                         total_users=total_users,
-                         total_bookings=total_bookings,
-                         pending_bookings=pending_bookings,
-                         recent_bookings=recent_bookings)
+    return render_template("admin/dashboard.html", recent_bookings=recent_bookings, **stats)
 
 @admin_bp.route("/users")
 @login_required
 @admin_required
+@replica_reads
 def users():
-    users = User.query.order_by(User.created_at.desc()).all()
-    return render_template("admin/users.html", users=users)
+    page = paginate_request(User.query, [User.created_at, User.id])
+    return render_template("admin/users.html", users=page.items, page=page)
 
 @admin_bp.route("/users/add", methods=["GET", "POST"])
 @login_required
@@ -83,6 +83,7 @@ def edit_user(user_id):
             if form.password.data:
                 user.set_password(form.password.data)
             db.session.commit()
+            invalidate_principal(user.id)
             flash("User updated successfully!", "success")
             return redirect(url_for("admin.users"))
     return render_template("admin/user_form.html", form=form, user=user, title="Edit User")
@@ -90,9 +91,10 @@ def edit_user(user_id):
 @admin_bp.route("/businesses")
 @login_required
 @admin_required
+@replica_reads
 def businesses():
-    businesses = Business.query.order_by(Business.created_at.desc()).all()
-    return render_template("admin/businesses.html", businesses=businesses)
+    page = paginate_request(Business.query.options(joinedload(Business.owner)), [Business.created_at, Business.id])
+    return render_template("admin/businesses.html", businesses=page.items, page=page)
 
 @admin_bp.route("/businesses/add", methods=["GET", "POST"])
 @login_required
@@ -110,9 +112,7 @@ def add_business():
             owner_id=form.owner_id.data,
             is_active=form.is_active.data
         )
-        business.generate_slug()
-        db.session.add(business)
-        db.session.commit()
+        business.insert_with_unique_slug()
         
         from datetime import time
         for day in range(7):
@@ -124,6 +124,7 @@ def add_business():
                 is_closed=(day >= 5)
             )
             db.session.add(wh)
+        enqueue_business_refresh(business.id)
         db.session.commit()
         
         flash("Business created successfully!", "success")
@@ -146,6 +147,7 @@ def edit_business(business_id):
         business.owner_id = form.owner_id.data
         business.is_active = form.is_active.data
         db.session.commit()
+        invalidate_tenant(business.id)
         flash("Business updated successfully!", "success")
         return redirect(url_for("admin.businesses"))
     return render_template("admin/business_form.html", form=form, business=business, title="Edit Business")
@@ -157,6 +159,7 @@ def toggle_business(business_id):
     business = Business.query.get_or_404(business_id)
     business.is_active = not business.is_active
     db.session.commit()
+    invalidate_tenant(business.id)
     status = "activated" if business.is_active else "deactivated"
     flash(f"Business {status} successfully!", "success")
     return redirect(url_for("admin.businesses"))
@@ -164,11 +167,12 @@ def toggle_business(business_id):
 @admin_bp.route("/bookings")
 @login_required
 @admin_required
+@replica_reads
 def bookings():
     status_filter = request.args.get("status", "all")
     business_filter = request.args.get("business", "all")
     
-    query = Booking.query
+    query = Booking.query.options(joinedload(Booking.business))
     
     if status_filter and status_filter != "all":
         query = query.filter_by(status=status_filter)
@@ -176,8 +180,28 @@ def bookings():
     if business_filter and business_filter != "all":
         query = query.filter_by(business_id=int(business_filter))
     
-    bookings = query.order_by(Booking.created_at.desc()).all()
+    page = paginate_request(query, [Booking.created_at, Booking.id])
     businesses = Business.query.order_by(Business.name).all()
     
-    return render_template("admin/bookings.html", bookings=bookings, businesses=businesses,
+    return render_template("admin/bookings.html", bookings=page.items, page=page, businesses=businesses,
                          status_filter=status_filter, business_filter=business_filter)
+
+@admin_bp.route("/reports")
+@login_required
+@admin_required
+@replica_reads
+def reports():
+    start_date, end_date = report_range(request.args)
+    report = admin_report(start_date, end_date)
+    return render_template("admin/reports.html", start_date=start_date, end_date=end_date, **report)
+
+@admin_bp.route("/cache-stats")
+@login_required
+@admin_required
+def cache_stats():
+    return jsonify({
+        "availability": availability_cache.stats(),
+        "tenant": tenant_cache.stats(),
+        "fragments": fragment_cache.stats(),
+        "principal": principal_cache.stats(),
+    })
@@ -3,6 +3,8 @@ from flask_login import login_user, logout_user, login_required, current_user
 from extensions import db
 from models import User
 from forms import LoginForm, RegisterForm
+from passwords import HashingBusy
+from throttle import login_ip_limiter, login_email_limiter, register_ip_limiter, register_email_limiter
 
 auth_bp = Blueprint("auth", __name__)
 
@@ -13,14 +15,34 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(email=form.email.data.lower()).first()
-        if user and user.check_password(form.password.data):
+        email = form.email.data.lower()
+        # checked before hashing, so a credential-stuffing burst costs no CPU once blocked
+        if login_ip_limiter.blocked(request.remote_addr) or login_email_limiter.blocked(email):
+            flash("Too many login attempts. Please try again later.", "error")
+            return render_template("auth/login.html", form=form), 429
+        user = User.query.filter_by(email=email).first()
+        try:
+            valid = user is not None and user.check_password(form.password.data)
+        except HashingBusy:
+            flash("The server is busy. Please try again in a moment.", "error")
+            return render_template("auth/login.html", form=form), 503
+        if valid:
+            login_email_limiter.reset(email)
+            if user.password_needs_rehash():
+                try:
+                    user.set_password(form.password.data)
+                    db.session.commit()
+                except HashingBusy:
+                    # the upgrade is retried on a later login rather than failing this one
+                    pass
             login_user(user)
             flash("Welcome back!", "success")
             next_page = request.args.get("next")
             if current_user.is_admin:
                 return redirect(next_page or url_for("admin.dashboard"))
             return redirect(next_page or url_for("dashboard.index"))
+        login_ip_limiter.hit(request.remote_addr)
+        login_email_limiter.hit(email)
         flash("Invalid email or password.", "error")
     return render_template("auth/login.html", form=form)
 
@@ -30,13 +52,26 @@ def register():
         return redirect(url_for("main.index"))
     
     form = RegisterForm()
+    if request.method == "POST":
+        # every submission counts, since the form's email check also probes the users table
+        email = (form.email.data or "").lower()
+        if register_ip_limiter.blocked(request.remote_addr) or (email and register_email_limiter.blocked(email)):
+            flash("Too many sign-up attempts. Please try again later.", "error")
+            return render_template("auth/register.html", form=form), 429
+        register_ip_limiter.hit(request.remote_addr)
+        if email:
+            register_email_limiter.hit(email)
     if form.validate_on_submit():
         user = User(
             email=form.email.data.lower(),
             first_name=form.first_name.data,
             last_name=form.last_name.data
         )
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except HashingBusy:
+            flash("The server is busy. Please try again in a moment.", "error")
+            return render_template("auth/register.html", form=form), 503
         db.session.add(user)
         db.session.commit()
         flash("Account created successfully! Please log in.", "success")
@@ -1,64 +1,39 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort
-from datetime import datetime, timedelta, date, time
-from extensions import db
-from models import Business, Service, WorkingHour, Booking
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, abort, current_app
+from datetime import datetime, timedelta, date
+from models import Service, Booking
 from forms import BookingForm
+from availability import get_available_slots, get_availability_range, get_next_available, MAX_RANGE_DAYS, NEXT_AVAILABLE_DAYS
+from reservations import reserve_booking
+from tenants import load_tenant
+from httpcache import conditional_response, slot_clock, slots_last_modified
 
 booking_bp = Blueprint("booking", __name__)
 
-def get_available_slots(business, service, booking_date):
-    day_of_week = booking_date.weekday()
-    working_hour = WorkingHour.query.filter_by(
-        business_id=business.id,
-        day_of_week=day_of_week
-    ).first()
-    
-    if not working_hour or working_hour.is_closed:
-        return []
-    
-    slots = []
-    current_time = datetime.combine(booking_date, working_hour.open_time)
-    end_time = datetime.combine(booking_date, working_hour.close_time)
-    slot_duration = timedelta(minutes=service.duration_minutes)
-    
-    existing_bookings = Booking.query.filter(
-        Booking.business_id == business.id,
-        Booking.booking_date == booking_date,
-        Booking.status.in_(["pending", "confirmed"])
-    ).all()
-    
-    while current_time + slot_duration <= end_time:
-        slot_start = current_time.time()
-        slot_end = (current_time + slot_duration).time()
-        
-        is_available = True
-        for booking in existing_bookings:
-            booking_start = booking.booking_time
-            booking_end = booking.end_time
-            
-            if not (slot_end <= booking_start or slot_start >= booking_end):
-                is_available = False
-                break
-        
-        if is_available:
-            if booking_date > date.today() or (booking_date == date.today() and slot_start > datetime.now().time()):
-                slots.append(slot_start.strftime("%H:%M"))
-        
-        current_time += timedelta(minutes=30)
-    
-    return slots
+def get_active_tenant(slug, revalidate=True):
+    tenant = load_tenant(slug, revalidate=revalidate)
+    if tenant is None or not tenant.is_active:
+        abort(404)
+    return tenant
+
+def tenant_slots(tenant, service, booking_date):
+    working_hour = tenant.working_hour(booking_date.weekday())
+    return get_available_slots(tenant, service, booking_date, working_hour=working_hour)
 
 @booking_bp.route("/<slug>/")
 def public_page(slug):
-    business = Business.query.filter_by(slug=slug, is_active=True).first_or_404()
-    services = Service.query.filter_by(business_id=business.id, is_active=True).order_by(Service.name).all()
-    working_hours = WorkingHour.query.filter_by(business_id=business.id).order_by(WorkingHour.day_of_week).all()
-    return render_template("booking/public_page.html", business=business, services=services, working_hours=working_hours)
+    # shows only the catalog (services and hours), so bookings never invalidate it
+    business = get_active_tenant(slug, revalidate=False)
+    return conditional_response(
+        business, current_app.config["PUBLIC_PAGE_MAX_AGE"],
+        lambda: render_template("booking/public_page.html", business=business, services=business.services,
+                                working_hours=business.hours),
+        stamp=f"c{business.catalog_version}", last_modified=business.catalog_updated_at
+    )
 
 @booking_bp.route("/<slug>/book", methods=["GET", "POST"])
 def book(slug):
-    business = Business.query.filter_by(slug=slug, is_active=True).first_or_404()
-    services = Service.query.filter_by(business_id=business.id, is_active=True).order_by(Service.name).all()
+    business = get_active_tenant(slug)
+    services = business.services
     
     if not services:
         flash("No services available for booking.", "error")
@@ -77,18 +52,18 @@ def book(slug):
         if service_id and booking_date_str:
             try:
                 booking_date = datetime.strptime(booking_date_str, "%Y-%m-%d").date()
-                service = Service.query.get(service_id)
-                if service and service.business_id == business.id:
-                    slots = get_available_slots(business, service, booking_date)
+                service = business.service(service_id)
+                if service:
+                    slots = tenant_slots(business, service, booking_date)
                     form.booking_time.choices = [(s, s) for s in slots]
             except ValueError:
                 pass
     elif selected_service_id and selected_date:
         try:
             booking_date = datetime.strptime(selected_date, "%Y-%m-%d").date()
-            service = Service.query.get(selected_service_id)
-            if service and service.business_id == business.id:
-                slots = get_available_slots(business, service, booking_date)
+            service = business.service(selected_service_id)
+            if service:
+                slots = tenant_slots(business, service, booking_date)
                 form.booking_time.choices = [(s, s) for s in slots]
         except ValueError:
             pass
@@ -99,26 +74,16 @@ def book(slug):
             flash("Invalid service selected.", "error")
             return redirect(url_for("booking.book", slug=slug))
         
-        booking_time = datetime.strptime(form.booking_time.data, "%H:%M").time()
-        
-        slots = get_available_slots(business, service, form.booking_date.data)
-        if form.booking_time.data not in slots:
-            flash("This time slot is no longer available.", "error")
-            return redirect(url_for("booking.book", slug=slug))
-        
-        booking = Booking(
-            business_id=business.id,
-            service_id=service.id,
+        booking = reserve_booking(
+            business, service, form.booking_date.data, form.booking_time.data,
             customer_name=form.customer_name.data,
             customer_phone=form.customer_phone.data,
             customer_email=form.customer_email.data,
-            booking_date=form.booking_date.data,
-            booking_time=booking_time,
-            notes=form.notes.data,
-            status="pending"
+            notes=form.notes.data
         )
-        db.session.add(booking)
-        db.session.commit()
+        if booking is None:
+            flash("This time slot is no longer available.", "error")
+            return redirect(url_for("booking.book", slug=slug))
         
         return redirect(url_for("booking.confirmation", slug=slug, booking_id=booking.id))
     
@@ -127,7 +92,7 @@ def book(slug):
 
 @booking_bp.route("/<slug>/slots")
 def get_slots(slug):
-    business = Business.query.filter_by(slug=slug, is_active=True).first_or_404()
+    business = get_active_tenant(slug)
     service_id = request.args.get("service_id", type=int)
     date_str = request.args.get("date")
     
@@ -139,15 +104,70 @@ def get_slots(slug):
     except ValueError:
         return jsonify({"slots": []})
     
-    service = Service.query.filter_by(id=service_id, business_id=business.id).first()
+    service = business.service(service_id)
     if not service:
         return jsonify({"slots": []})
     
-    slots = get_available_slots(business, service, booking_date)
-    return jsonify({"slots": slots})
+    return conditional_response(
+        business, current_app.config["SLOTS_MAX_AGE"],
+        lambda: jsonify({"slots": tenant_slots(business, service, booking_date)}),
+        parts=(service.id, booking_date.isoformat()) + slot_clock(booking_date),
+        last_modified=slots_last_modified(business, booking_date)
+    )
+
+@booking_bp.route("/<slug>/availability")
+def get_availability(slug):
+    business = get_active_tenant(slug)
+    service_id = request.args.get("service_id", type=int)
+    from_str = request.args.get("from")
+    to_str = request.args.get("to") or from_str
+    
+    if not service_id or not from_str:
+        return jsonify({"availability": {}})
+    
+    try:
+        start_date = datetime.strptime(from_str, "%Y-%m-%d").date()
+        end_date = datetime.strptime(to_str, "%Y-%m-%d").date()
+    except ValueError:
+        return jsonify({"availability": {}})
+    
+    if end_date < start_date:
+        return jsonify({"availability": {}})
+    end_date = min(end_date, start_date + timedelta(days=MAX_RANGE_DAYS - 1))
+    
+    service = business.service(service_id)
+    if not service:
+        return jsonify({"availability": {}})
+    
+    return conditional_response(
+        business, current_app.config["SLOTS_MAX_AGE"],
+        lambda: jsonify({"from": start_date.isoformat(), "to": end_date.isoformat(),
+                         "availability": get_availability_range(business, service, start_date, end_date,
+                                                                working_hours=business.hours)}),
+        parts=(service.id, start_date.isoformat(), end_date.isoformat()) + slot_clock(start_date, end_date),
+        last_modified=slots_last_modified(business, start_date, end_date)
+    )
+
+@booking_bp.route("/<slug>/next-available")
+def next_available(slug):
+    business = get_active_tenant(slug)
+    start_date = date.today()
+    end_date = start_date + timedelta(days=NEXT_AVAILABLE_DAYS - 1)
+    return conditional_response(
+        business, current_app.config["SLOTS_MAX_AGE"],
+        lambda: jsonify({"services": {
+            str(service_id): slot for service_id, slot in get_next_available(
+                business, business.services, start_date, working_hours=business.hours
+            ).items()
+        }}),
+        parts=("next", start_date.isoformat()) + slot_clock(start_date, end_date),
+        last_modified=slots_last_modified(business, start_date, end_date)
+    )
 
 @booking_bp.route("/<slug>/confirmation/<int:booking_id>")
 def confirmation(slug, booking_id):
-    business = Business.query.filter_by(slug=slug).first_or_404()
+    business = load_tenant(slug)
+    if business is None:
+        abort(404)
     booking = Booking.query.filter_by(id=booking_id, business_id=business.id).first_or_404()
     return render_template("booking/confirmation.html", business=business, booking=booking)
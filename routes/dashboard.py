@@ -1,9 +1,17 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort, Response, stream_with_context
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta, time
 from extensions import db
 from models import Business, Service, WorkingHour, Booking
-from forms import BusinessForm, ServiceForm, WorkingHourForm, BookingStatusForm
+from forms import BusinessForm, ServiceForm, WorkingHourForm, BookingStatusForm, BookingImportForm
+from availability import invalidate_availability
+from tenants import invalidate_tenant
+from reservations import change_booking_status
+from pagination import paginate_request
+from replicas import replica_reads
+from stats import business_dashboard_stats
+from rollups import business_report, enqueue_business_refresh, report_range
+from bulk import EXPORTERS, format_for_filename, import_bookings, read_rows, text_stream
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
@@ -13,6 +21,7 @@ def get_user_business():
 
 @dashboard_bp.route("/")
 @login_required
+@replica_reads
 def index():
     if current_user.is_admin:
         return redirect(url_for("admin.dashboard"))
@@ -28,16 +37,12 @@ def index():
         Booking.status.in_(["pending", "confirmed"])
     ).order_by(Booking.booking_date, Booking.booking_time).limit(5).all()
     
-    total_bookings = Booking.query.filter_by(business_id=business.id).count()
-    pending_count = Booking.query.filter_by(business_id=business.id, status="pending").count()
-    services_count = Service.query.filter_by(business_id=business.id, is_active=True).count()
+    stats = business_dashboard_stats(business)
     
     return render_template("dashboard/index.html", 
                          business=business, 
                          upcoming_bookings=upcoming_bookings,
-                         total_bookings=total_bookings,
-                         pending_count=pending_count,
-                         services_count=services_count)
+                         **stats)
 
 @dashboard_bp.route("/business/create", methods=["GET", "POST"])
 @login_required
@@ -55,9 +60,7 @@ def create_business():
             description=form.description.data,
             owner_id=current_user.id
         )
-        business.generate_slug()
-        db.session.add(business)
-        db.session.commit()
+        business.insert_with_unique_slug()
         
         for day in range(7):
             if day < 5:
@@ -77,6 +80,7 @@ def create_business():
                     is_closed=True
                 )
             db.session.add(wh)
+        enqueue_business_refresh(business.id)
         db.session.commit()
         
         flash("Business created successfully!", "success")
@@ -97,12 +101,14 @@ def edit_business():
         business.address = form.address.data
         business.description = form.description.data
         db.session.commit()
+        invalidate_tenant(business.id)
         flash("Business updated successfully!", "success")
         return redirect(url_for("dashboard.index"))
     return render_template("dashboard/edit_business.html", form=form, business=business)
 
 @dashboard_bp.route("/services")
 @login_required
+@replica_reads
 def services():
     business = get_user_business()
     if not business:
@@ -129,6 +135,7 @@ def add_service():
         )
         db.session.add(service)
         db.session.commit()
+        invalidate_tenant(business.id)
         flash("Service added successfully!", "success")
         return redirect(url_for("dashboard.services"))
     return render_template("dashboard/service_form.html", form=form, business=business, title="Add Service")
@@ -148,6 +155,8 @@ def edit_service(service_id):
         service.price = form.price.data
         service.duration_minutes = form.duration_minutes.data
         db.session.commit()
+        invalidate_tenant(business.id)
+        invalidate_availability(business.id)
         flash("Service updated successfully!", "success")
         return redirect(url_for("dashboard.services"))
     return render_template("dashboard/service_form.html", form=form, business=business, service=service, title="Edit Service")
@@ -162,11 +171,13 @@ def delete_service(service_id):
     service = Service.query.filter_by(id=service_id, business_id=business.id).first_or_404()
     service.is_active = False
     db.session.commit()
+    invalidate_tenant(business.id)
     flash("Service deleted successfully!", "success")
     return redirect(url_for("dashboard.services"))
 
 @dashboard_bp.route("/hours")
 @login_required
+@replica_reads
 def working_hours():
     business = get_user_business()
     if not business:
@@ -188,13 +199,17 @@ def edit_working_hour(hour_id):
         hour.open_time = form.open_time.data
         hour.close_time = form.close_time.data
         hour.is_closed = form.is_closed.data
+        enqueue_business_refresh(business.id)
         db.session.commit()
+        invalidate_tenant(business.id)
+        invalidate_availability(business.id)
         flash("Working hours updated!", "success")
         return redirect(url_for("dashboard.working_hours"))
     return render_template("dashboard/edit_hour.html", form=form, hour=hour, business=business)
 
 @dashboard_bp.route("/bookings")
 @login_required
+@replica_reads
 def bookings():
     business = get_user_business()
     if not business:
@@ -215,10 +230,56 @@ def bookings():
         except ValueError:
             pass
     
-    bookings = query.order_by(Booking.booking_date.desc(), Booking.booking_time.desc()).all()
-    return render_template("dashboard/bookings.html", bookings=bookings, business=business, 
+    page = paginate_request(query, [Booking.booking_date, Booking.booking_time, Booking.id])
+    return render_template("dashboard/bookings.html", bookings=page.items, page=page, business=business, 
                          status_filter=status_filter, date_filter=date_filter)
 
+@dashboard_bp.route("/reports")
+@login_required
+@replica_reads
+def reports():
+    business = get_user_business()
+    if not business:
+        return redirect(url_for("dashboard.create_business"))
+    
+    start_date, end_date = report_range(request.args)
+    report = business_report(business.id, start_date, end_date)
+    return render_template("dashboard/reports.html", business=business, start_date=start_date,
+                         end_date=end_date, **report)
+
+@dashboard_bp.route("/bookings/import", methods=["GET", "POST"])
+@login_required
+def import_bookings_view():
+    business = get_user_business()
+    if not business:
+        return redirect(url_for("dashboard.create_business"))
+    
+    form = BookingImportForm()
+    result = None
+    if form.validate_on_submit():
+        upload = form.file.data
+        rows = read_rows(text_stream(upload.stream), format_for_filename(upload.filename))
+        result = import_bookings(business, rows)
+        flash(f"Imported {result.inserted} bookings, {result.rejected} rejected.",
+              "success" if not result.rejected else "info")
+    return render_template("dashboard/import_bookings.html", form=form, result=result, business=business)
+
+@dashboard_bp.route("/bookings/export")
+@login_required
+@replica_reads
+def export_bookings():
+    business = get_user_business()
+    if not business:
+        abort(404)
+    
+    fmt = request.args.get("format", "csv")
+    if fmt not in EXPORTERS:
+        abort(400)
+    exporter, mimetype = EXPORTERS[fmt]
+    filename = f"{business.slug}-bookings.{fmt}"
+    return Response(stream_with_context(exporter(business.id)), mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename={filename}"})
+
 @dashboard_bp.route("/bookings/<int:booking_id>", methods=["GET", "POST"])
 @login_required
 def booking_detail(booking_id):
@@ -230,8 +291,9 @@ def booking_detail(booking_id):
     form = BookingStatusForm(obj=booking)
     
     if form.validate_on_submit():
-        booking.status = form.status.data
-        db.session.commit()
+        if not change_booking_status(booking, form.status.data):
+            flash("This booking now overlaps another booking, so its status was not changed.", "error")
+            return redirect(url_for("dashboard.booking_detail", booking_id=booking_id))
         flash("Booking status updated!", "success")
         return redirect(url_for("dashboard.bookings"))
     
@@ -245,8 +307,9 @@ def confirm_booking(booking_id):
         abort(404)
     
     booking = Booking.query.filter_by(id=booking_id, business_id=business.id).first_or_404()
-    booking.status = "confirmed"
-    db.session.commit()
+    if not change_booking_status(booking, "confirmed"):
+        flash("This booking now overlaps another booking and can't be confirmed.", "error")
+        return redirect(url_for("dashboard.bookings"))
     flash("Booking confirmed!", "success")
     return redirect(url_for("dashboard.bookings"))
 
@@ -258,7 +321,6 @@ def cancel_booking(booking_id):
         abort(404)
     
     booking = Booking.query.filter_by(id=booking_id, business_id=business.id).first_or_404()
-    booking.status = "cancelled"
-    db.session.commit()
+    change_booking_status(booking, "cancelled")
     flash("Booking cancelled.", "info")
     return redirect(url_for("dashboard.bookings"))
@@ -1,9 +1,11 @@
 from app import app
 from extensions import db
 from models import User
+import migrations
 
 def create_admin():
     with app.app_context():
+        migrations.upgrade()
         admin = User.query.filter_by(email="admin@melsconnect.com").first()
         if not admin:
             admin = User(
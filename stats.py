@@ -0,0 +1,128 @@
+from flask import current_app
+from sqlalchemy import case, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models import User, Business, Service, Booking, BookingCounter
+
+
+def use_counters():
+    return current_app.config.get("STATS_USE_COUNTERS", False)
+
+
+def booking_status_counts(business_id=None):
+    if use_counters():
+        query = db.session.query(BookingCounter.status, func.sum(BookingCounter.booking_count))
+        if business_id is not None:
+            query = query.filter(BookingCounter.business_id == business_id)
+        rows = query.group_by(BookingCounter.status).all()
+    else:
+        query = db.session.query(Booking.status, func.count(Booking.id))
+        if business_id is not None:
+            query = query.filter(Booking.business_id == business_id)
+        rows = query.group_by(Booking.status).all()
+    counts = dict.fromkeys(Booking.STATUS_CHOICES, 0)
+    counts.update({status: int(count or 0) for status, count in rows})
+    counts["total"] = sum(counts.values())
+    return counts
+
+
+def business_dashboard_stats(business):
+    bookings = booking_status_counts(business.id)
+    services_count = db.session.query(func.count(Service.id)).filter(
+        Service.business_id == business.id,
+        Service.is_active.is_(True)
+    ).scalar()
+    return {
+        "total_bookings": bookings["total"],
+        "pending_count": bookings.get("pending", 0),
+        "services_count": services_count,
+    }
+
+
+def admin_dashboard_stats():
+    total_businesses, active_businesses = db.session.query(
+        func.count(Business.id),
+        func.sum(case((Business.is_active.is_(True), 1), else_=0))
+    ).one()
+    total_users = db.session.query(func.count(User.id)).scalar()
+    bookings = booking_status_counts()
+    return {
+        "total_businesses": total_businesses,
+        "active_businesses": int(active_businesses or 0),
+        "total_users": total_users,
+        "total_bookings": bookings["total"],
+        "pending_bookings": bookings.get("pending", 0),
+    }
+
+
+def adjust_counter(connection, business_id, status, delta):
+    table = BookingCounter.__table__
+    dialect = connection.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table).values(business_id=business_id, status=status, booking_count=delta)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.business_id, table.c.status],
+            set_={"booking_count": table.c.booking_count + delta}
+        )
+        connection.execute(stmt)
+        return
+    result = connection.execute(update(table).where(
+        table.c.business_id == business_id,
+        table.c.status == status
+    ).values(booking_count=table.c.booking_count + delta))
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(business_id=business_id, status=status, booking_count=delta))
+
+
+@event.listens_for(Booking.status, "set", active_history=True)
+def _load_previous_status(target, value, oldvalue, initiator):
+    # active_history makes the old status available to after_update even when expired
+    pass
+
+
+@event.listens_for(Booking, "after_insert")
+def _count_inserted_booking(mapper, connection, target):
+    adjust_counter(connection, target.business_id, target.status or "pending", 1)
+
+
+@event.listens_for(Booking, "after_update")
+def _count_status_change(mapper, connection, target):
+    history = inspect(target).attrs.status.history
+    if not history.has_changes():
+        return
+    for old_status in history.deleted:
+        if old_status:
+            adjust_counter(connection, target.business_id, old_status, -1)
+    for new_status in history.added:
+        if new_status:
+            adjust_counter(connection, target.business_id, new_status, 1)
+
+
+@event.listens_for(Booking, "after_delete")
+def _count_deleted_booking(mapper, connection, target):
+    adjust_counter(connection, target.business_id, target.status or "pending", -1)
+
+
+def rebuild_counters(connection):
+    table = BookingCounter.__table__
+    connection.execute(table.delete())
+    rows = connection.execute(
+        select(Booking.business_id, Booking.status, func.count(Booking.id))
+        .group_by(Booking.business_id, Booking.status)
+    ).all()
+    if rows:
+        connection.execute(table.insert(), [
+            {"business_id": business_id, "status": status, "booking_count": count}
+            for business_id, status, count in rows if status
+        ])
+
+
+def init_app(app):
+    app.config.setdefault("STATS_USE_COUNTERS", False)
+
+    @app.cli.command("rebuild-booking-counters")
+    def rebuild_counters_command():
+        with db.engine.begin() as connection:
+            rebuild_counters(connection)
+        print("Booking counters rebuilt.")
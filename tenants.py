@@ -0,0 +1,122 @@
+from typing import NamedTuple
+from datetime import datetime, time
+from decimal import Decimal
+from extensions import db
+from cache import MemoryBackend, TenantCache
+from models import Business, Service, WorkingHour
+
+TENANT_CACHE_MAX_ENTRIES = 1024
+# Bounds staleness when another worker process handled the edit.
+TENANT_CACHE_TTL_SECONDS = 300
+
+tenant_cache = TenantCache("tenant", MemoryBackend(max_entries=TENANT_CACHE_MAX_ENTRIES, ttl=TENANT_CACHE_TTL_SECONDS))
+# slugs never change after creation, so this mapping only needs LRU bounds
+slug_cache = MemoryBackend(max_entries=TENANT_CACHE_MAX_ENTRIES * 4)
+
+
+class ServiceSnapshot(NamedTuple):
+    id: int
+    name: str
+    description: str
+    price: Decimal
+    duration_minutes: int
+
+
+class HourSnapshot(NamedTuple):
+    day_of_week: int
+    open_time: time
+    close_time: time
+    is_closed: bool
+
+    @property
+    def day_name(self):
+        return WorkingHour.DAY_NAMES[self.day_of_week]
+
+
+class TenantSnapshot(NamedTuple):
+    id: int
+    slug: str
+    name: str
+    description: str
+    phone: str
+    address: str
+    is_active: bool
+    version: int
+    updated_at: datetime
+    catalog_version: int
+    catalog_updated_at: datetime
+    services: tuple
+    hours: tuple
+
+    def service(self, service_id):
+        for service in self.services:
+            if service.id == service_id:
+                return service
+        return None
+
+    def working_hour(self, day_of_week):
+        for hour in self.hours:
+            if hour.day_of_week == day_of_week:
+                return hour
+        return None
+
+
+def build_snapshot(business_id):
+    business = db.session.get(Business, business_id)
+    if business is None:
+        return None
+    services = Service.query.filter_by(business_id=business.id, is_active=True).order_by(Service.name).all()
+    hours = WorkingHour.query.filter_by(business_id=business.id).order_by(WorkingHour.day_of_week).all()
+    return TenantSnapshot(
+        id=business.id,
+        slug=business.slug,
+        name=business.name,
+        description=business.description,
+        phone=business.phone,
+        address=business.address,
+        is_active=bool(business.is_active),
+        version=business.version,
+        updated_at=business.updated_at,
+        catalog_version=business.catalog_version,
+        catalog_updated_at=business.catalog_updated_at,
+        services=tuple(ServiceSnapshot(s.id, s.name, s.description, s.price, s.duration_minutes) for s in services),
+        hours=tuple(HourSnapshot(h.day_of_week, h.open_time, h.close_time, bool(h.is_closed)) for h in hours),
+    )
+
+
+def load_tenant(slug, revalidate=False):
+    # Without revalidate a warm tenant costs no queries; edits made through
+    # other worker processes show up once the TTL expires. revalidate costs one
+    # indexed lookup of the stamps: the snapshot is rebuilt only when the
+    # catalog changed, and the booking-driven version and updated_at are taken
+    # from the row so HTTP validators and slot cache keys stay current.
+    stamps = None
+    if revalidate:
+        stamps = Business.query.with_entities(
+            Business.id, Business.version, Business.updated_at, Business.catalog_version
+        ).filter_by(slug=slug).first()
+        if stamps is None:
+            return None
+        business_id = stamps.id
+    else:
+        business_id = slug_cache.get(slug)
+        if business_id is None:
+            row = Business.query.with_entities(Business.id).filter_by(slug=slug).first()
+            if row is None:
+                return None
+            business_id = row.id
+            slug_cache.set(slug, business_id)
+
+    tenant = tenant_cache.get_or_compute(business_id, ("snapshot",), lambda: build_snapshot(business_id))
+    if tenant is None or stamps is None:
+        return tenant
+    if tenant.catalog_version < stamps.catalog_version:
+        invalidate_tenant(business_id)
+        tenant = tenant_cache.get_or_compute(business_id, ("snapshot",), lambda: build_snapshot(business_id))
+        if tenant is None:
+            return None
+    return tenant._replace(version=stamps.version, updated_at=stamps.updated_at)
+
+
+def invalidate_tenant(business_id):
+    tenant_cache.invalidate(business_id)
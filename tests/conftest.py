@@ -0,0 +1,100 @@
+import os
+import sys
+import tempfile
+from datetime import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# the module-level app in app.py must never point at a real database
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'default.db')}"
+os.environ.setdefault("SESSION_SECRET", "test-secret")
+
+PASSWORD = "test-password"
+
+
+def clear_caches():
+    import availability
+    import fragments
+    import principals
+    import tenants
+    import throttle
+    for cache in (availability.availability_cache, tenants.tenant_cache, fragments.fragment_cache,
+                  principals.principal_cache):
+        cache.clear()
+    tenants.slug_cache.clear()
+    for limiter in throttle.LIMITERS:
+        limiter.backend.clear()
+
+
+def make_app(database_url, **config):
+    from app import create_app
+    import migrations
+    app = create_app(dict({
+        "SQLALCHEMY_DATABASE_URI": database_url,
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,
+    }, **config))
+    with app.app_context():
+        migrations.upgrade()
+    clear_caches()
+    return app
+
+
+@pytest.fixture
+def app(tmp_path):
+    from extensions import db
+    app = make_app(f"sqlite:///{tmp_path / 'test.db'}")
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def race_app(request, tmp_path):
+    from extensions import db
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path / 'race.db'}"
+    else:
+        url = os.environ.get("TEST_POSTGRES_URL")
+        if not url:
+            pytest.skip("set TEST_POSTGRES_URL to run the concurrency tests against PostgreSQL")
+    app = make_app(url)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def make_user(email, is_admin=False):
+    from extensions import db
+    from models import User
+    user = User(email=email, first_name="Test", last_name="User", is_admin=is_admin)
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def make_business(owner, name="Test Salon", services=(("Cut", 20, 30),), open_time=time(9, 0), close_time=time(17, 0)):
+    from extensions import db
+    from models import Business, Service, WorkingHour
+    business = Business(name=name, owner_id=owner.id)
+    business.insert_with_unique_slug()
+    for service_name, price, duration in services:
+        db.session.add(Service(business_id=business.id, name=service_name, price=price, duration_minutes=duration))
+    for day in range(7):
+        db.session.add(WorkingHour(business_id=business.id, day_of_week=day, open_time=open_time,
+                                   close_time=close_time, is_closed=False))
+    db.session.commit()
+    return business
+
+
+def login(client, email):
+    response = client.post("/auth/login", data={"email": email, "password": PASSWORD})
+    assert response.status_code == 302, response.status_code
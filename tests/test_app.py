@@ -0,0 +1,43 @@
+import gc
+import os
+import weakref
+
+import pytest
+
+from conftest import make_app
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_fork_disposes_pools_of_live_apps_only(tmp_path):
+    import app as app_module
+    from extensions import db
+    apps = [make_app(f"sqlite:///{tmp_path / f'app{n}.db'}") for n in range(3)]
+    pools = []
+    for app in apps:
+        with app.app_context():
+            pools.append(db.engine.pool)
+    del app
+    # the fork hook must not keep an app alive
+    gone = weakref.ref(apps.pop())
+    pools.pop()
+    gc.collect()
+    assert gone() is None
+    assert all(app in app_module._apps for app in apps)
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # child: report whether every live app got a fresh pool
+        replaced = True
+        for app, pool in zip(apps, pools):
+            with app.app_context():
+                replaced = replaced and db.engine.pool is not pool
+        os.write(write, b"1" if replaced else b"0")
+        os._exit(0)
+    os.close(write)
+    os.waitpid(pid, 0)
+    assert os.read(read, 1) == b"1"
+    os.close(read)
+    for app, pool in zip(apps, pools):
+        with app.app_context():
+            assert db.engine.pool is pool
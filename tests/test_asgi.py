@@ -0,0 +1,77 @@
+import asyncio
+import json
+from datetime import date, time, timedelta
+
+import pytest
+
+from conftest import make_business, make_user
+
+pytest.importorskip("aiosqlite")
+
+
+def call(path, query="", method="GET"):
+    import asgi
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query.encode(), "headers": []}
+    asyncio.run(asgi.app(scope, receive, send))
+    start, body = messages
+    return start["status"], dict(start["headers"]), body["body"]
+
+
+@pytest.fixture
+def async_engine(app):
+    import asgi
+    from sqlalchemy.ext.asyncio import create_async_engine
+    asgi.engine = create_async_engine(asgi.async_database_url(app.config["SQLALCHEMY_DATABASE_URI"]))
+    yield
+    asyncio.run(asgi.engine.dispose())
+    asgi.engine = None
+
+
+def test_matches_the_flask_endpoints(app, client, async_engine):
+    from availability import availability_cache
+    from extensions import db
+    from models import Booking
+    day = date.today() + timedelta(days=2)
+    with app.app_context():
+        # 30 minutes reads the day bitmap, 32 minutes is off the cell grid and reads booking rows
+        business = make_business(make_user("owner@example.com"), services=(("Cut", 20, 30), ("Trim", 15, 32)),
+                                 open_time=time(9, 5), close_time=time(13, 0))
+        for start, duration in ((time(9, 35), 45), (time(11, 5), 25)):
+            db.session.add(Booking(business_id=business.id, service_id=business.services[0].id, customer_name="Customer",
+                                   customer_phone="5550000000", booking_date=day, booking_time=start,
+                                   duration_minutes=duration, status="confirmed"))
+        db.session.commit()
+        slug, service_ids = business.slug, [service.id for service in business.services]
+
+    for service_id in service_ids:
+        expected = client.get(f"/b/{slug}/slots?service_id={service_id}&date={day}").get_json()
+        assert expected["slots"]
+        availability_cache.clear()
+        status, _, body = call(f"/b/{slug}/slots", f"service_id={service_id}&date={day}")
+        assert status == 200 and json.loads(body) == expected
+
+        query = f"service_id={service_id}&from={day - timedelta(days=1)}&to={day + timedelta(days=1)}"
+        expected = client.get(f"/b/{slug}/availability?{query}").get_json()
+        status, _, body = call(f"/b/{slug}/availability", query)
+        assert status == 200 and json.loads(body) == expected
+
+
+def test_head_has_no_body(app, async_engine):
+    with app.app_context():
+        business = make_business(make_user("owner@example.com"))
+        slug, service_id = business.slug, business.services[0].id
+    query = f"service_id={service_id}&date={date.today() + timedelta(days=1)}"
+
+    _, get_headers, get_body = call(f"/b/{slug}/slots", query)
+    status, headers, body = call(f"/b/{slug}/slots", query, method="HEAD")
+    assert status == 200 and body == b""
+    assert headers[b"content-length"] == get_headers[b"content-length"] == str(len(get_body)).encode()
+    assert call("/missing", method="HEAD")[2] == b""
@@ -0,0 +1,82 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from conftest import PASSWORD, make_app, make_user
+
+
+def post_login(client, email, password="wrong-password", **kwargs):
+    return client.post("/auth/login", data={"email": email, "password": password}, **kwargs)
+
+
+def post_register(client, email, **kwargs):
+    # the confirmation never matches, so no account is created and the email stays free
+    return client.post("/auth/register", data={
+        "email": email, "first_name": "New", "last_name": "User", "password": PASSWORD, "confirm_password": "x",
+    }, **kwargs)
+
+
+@pytest.fixture
+def proxied_app(tmp_path):
+    from extensions import db
+    app = make_app(f"sqlite:///{tmp_path / 'proxied.db'}", PROXY_TRUSTED_HOPS=1, LOGIN_ATTEMPTS_PER_IP=2)
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+def test_trusted_proxy_limits_each_client(proxied_app):
+    client = proxied_app.test_client()
+    for email in ("a@example.com", "b@example.com"):
+        post_login(client, email, headers={"X-Forwarded-For": "198.51.100.1"})
+    assert post_login(client, "c@example.com", headers={"X-Forwarded-For": "198.51.100.1"}).status_code == 429
+    assert post_login(client, "c@example.com", headers={"X-Forwarded-For": "198.51.100.2"}).status_code == 200
+
+
+def test_forwarded_for_is_ignored_without_trusted_hops(app, client):
+    app.config["LOGIN_ATTEMPTS_PER_IP"] = 2
+    for address, email in (("198.51.100.1", "a@example.com"), ("198.51.100.2", "b@example.com")):
+        post_login(client, email, headers={"X-Forwarded-For": address})
+    assert post_login(client, "c@example.com", headers={"X-Forwarded-For": "198.51.100.3"}).status_code == 429
+
+
+def test_register_is_limited_per_email(app, client):
+    app.config["REGISTER_ATTEMPTS_PER_EMAIL"] = 2
+    for _ in range(2):
+        post_register(client, "new@example.com")
+    assert post_register(client, "NEW@example.com").status_code == 429
+    assert post_register(client, "other@example.com").status_code == 200
+
+
+def test_busy_rehash_does_not_fail_the_login(app, client, monkeypatch):
+    import passwords
+    from models import User
+    with app.app_context():
+        make_user("owner@example.com")
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256:1000"
+
+    def busy(password):
+        raise passwords.HashingBusy("password hashing pool is saturated")
+
+    monkeypatch.setattr("models.hash_password", busy)
+    response = post_login(client, "owner@example.com", PASSWORD)
+    assert response.status_code == 302
+    with app.app_context():
+        assert User.query.filter_by(email="owner@example.com").one().password_needs_rehash()
+
+
+def test_concurrent_hits_are_all_counted(app, monkeypatch):
+    from throttle import login_ip_limiter
+    get = login_ip_limiter.backend.get
+
+    def slow_get(key):
+        # widens the gap between reading and writing the count
+        value = get(key)
+        time.sleep(0.0005)
+        return value
+
+    monkeypatch.setattr(login_ip_limiter.backend, "get", slow_get)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: login_ip_limiter.hit("203.0.113.9"), range(200)))
+    assert login_ip_limiter.hit("203.0.113.9") == 201
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+
+from conftest import make_business, make_user
+
+REQUESTS = 24
+THREADS = 12
+
+
+def seed(app):
+    from models import Service
+    with app.app_context():
+        owner = make_user(f"race-{os.urandom(4).hex()}@example.com")
+        business = make_business(owner, name=f"Race {owner.email}", open_time=time(0, 0), close_time=time(23, 30))
+        return business.slug, business.id, Service.query.filter_by(business_id=business.id).one().id
+
+
+def post_booking(app, slug, service_id, booking_date, slot, name):
+    response = app.test_client().post(f"/b/{slug}/book", data={
+        "service_id": service_id, "booking_date": booking_date.isoformat(), "booking_time": slot,
+        "customer_name": name, "customer_phone": "5550000000",
+    })
+    return response.status_code == 302 and "/confirmation/" in response.headers.get("Location", "")
+
+
+def race(app, jobs):
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        return list(pool.map(lambda job: post_booking(app, *job), jobs))
+
+
+def test_same_slot_has_exactly_one_winner(race_app):
+    from models import Booking
+    slug, business_id, service_id = seed(race_app)
+    booking_date = date.today() + timedelta(days=1)
+    results = race(race_app, [(slug, service_id, booking_date, "10:00", f"Racer {i}") for i in range(REQUESTS)])
+    with race_app.app_context():
+        stored = Booking.query.filter_by(business_id=business_id, booking_date=booking_date).count()
+    assert sum(results) == 1
+    assert stored == 1
+
+
+def test_distinct_slots_all_succeed(race_app):
+    from models import Booking
+    slug, business_id, service_id = seed(race_app)
+    booking_date = date.today() + timedelta(days=1)
+    jobs = [(slug, service_id, booking_date, f"{10 + i // 2:02d}:{(i % 2) * 30:02d}", f"Customer {i}")
+            for i in range(REQUESTS)]
+    assert all(race(race_app, jobs))
+    with race_app.app_context():
+        assert Booking.query.filter_by(business_id=business_id).count() == REQUESTS
@@ -0,0 +1,51 @@
+from datetime import date, time, timedelta
+
+from conftest import login, make_business, make_user
+
+
+def book(client, slug, service_id, booking_date, slot):
+    return client.post(f"/b/{slug}/book", data={
+        "service_id": service_id, "booking_date": booking_date.isoformat(), "booking_time": slot,
+        "customer_name": "Customer", "customer_phone": "5550000000",
+    })
+
+
+def test_reactivating_a_cancelled_booking_cannot_overlap(app, client):
+    from extensions import db
+    from models import Booking, Service
+    with app.app_context():
+        business = make_business(make_user("owner@example.com"))
+        slug, service_id = business.slug, Service.query.one().id
+    booking_date = date.today() + timedelta(days=2)
+    assert book(app.test_client(), slug, service_id, booking_date, "10:00").status_code == 302
+    login(client, "owner@example.com")
+    with app.app_context():
+        first_id = Booking.query.one().id
+    client.post(f"/dashboard/bookings/{first_id}/cancel")
+    assert book(app.test_client(), slug, service_id, booking_date, "10:00").status_code == 302
+
+    response = client.post(f"/dashboard/bookings/{first_id}/confirm", follow_redirects=True)
+    assert b"overlaps another booking" in response.data
+    response = client.post(f"/dashboard/bookings/{first_id}", data={"status": "pending"}, follow_redirects=True)
+    assert response.status_code == 200 and b"overlaps another booking" in response.data
+    with app.app_context():
+        assert db.session.get(Booking, first_id).status == "cancelled"
+        assert Booking.query.filter(Booking.status.in_(["pending", "confirmed"])).count() == 1
+
+
+def test_reactivating_a_free_slot_succeeds(app, client):
+    from extensions import db
+    from models import Booking, Service
+    with app.app_context():
+        business = make_business(make_user("owner@example.com"))
+        slug, service_id = business.slug, Service.query.one().id
+    booking_date = date.today() + timedelta(days=2)
+    book(app.test_client(), slug, service_id, booking_date, "10:00")
+    login(client, "owner@example.com")
+    with app.app_context():
+        booking_id = Booking.query.one().id
+    client.post(f"/dashboard/bookings/{booking_id}/cancel")
+    client.post(f"/dashboard/bookings/{booking_id}/confirm")
+    with app.app_context():
+        booking = db.session.get(Booking, booking_id)
+        assert booking.status == "confirmed" and booking.booking_time == time(10, 0)
@@ -0,0 +1,78 @@
+import io
+import json
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import login, make_business, make_user
+
+DAY = (date.today() + timedelta(days=3)).isoformat()
+
+
+@pytest.fixture
+def owner_client(app, client):
+    with app.app_context():
+        make_business(make_user("owner@example.com"))
+    login(client, "owner@example.com")
+    return client
+
+
+def upload(client, content, filename):
+    return client.post("/dashboard/bookings/import", data={"file": (io.BytesIO(content), filename)},
+                       content_type="multipart/form-data")
+
+
+def booking_count(app):
+    from models import Booking
+    with app.app_context():
+        return Booking.query.count()
+
+
+def test_invalid_utf8_is_reported_not_a_500(app, owner_client):
+    header = b"service,booking_date,booking_time,customer_name,customer_phone\n"
+    # far enough ahead of the bad bytes that those rows are decoded in an earlier chunk
+    rows = b"".join(f"Cut,{DAY},{9 + n % 8:02d}:00,Customer {n},5550000000\n".encode() for n in range(400))
+    response = upload(owner_client, header + rows + b"\xff\xfe\xfa broken\n", "bookings.csv")
+    assert response.status_code == 200
+    assert b"not valid UTF-8 text" in response.data
+    assert booking_count(app) == 8
+
+    response = upload(owner_client, b"\xff\xfe" + header, "b.csv")
+    assert response.status_code == 200 and b"not valid UTF-8 text" in response.data
+
+
+def test_json_array_imports(app, owner_client):
+    rows = [{"service": "Cut", "booking_date": DAY, "booking_time": f"{hour}:00", "customer_name": "Customer",
+             "customer_phone": 5550000000} for hour in (10, 11)]
+    response = upload(owner_client, json.dumps(rows).encode(), "bookings.json")
+    assert b"Imported 2 bookings, 0 rejected" in response.data
+    assert b"not valid JSON" in upload(owner_client, b"[{", "broken.json").data
+
+
+def test_rejections_explain_the_problem(owner_client):
+    rows = [
+        {"service_id": "abc", "booking_date": DAY, "booking_time": "10:00"},
+        {"service": "Cut", "booking_date": 20260101, "booking_time": "10:00"},
+        {"service": "Cut", "booking_date": DAY, "booking_time": 1000},
+        {"service": "Cut", "booking_date": DAY, "booking_time": "10:00", "customer_name": 42},
+    ]
+    data = upload(owner_client, "\n".join(json.dumps(row) for row in rows).encode(), "bookings.jsonl").data.decode()
+    assert "Line 1: service_id must be an integer" in data
+    assert "Line 2: booking_date must be a date in YYYY-MM-DD format" in data
+    assert "Line 3: booking_time must be a time in HH:MM format" in data
+    assert "Line 4: customer_name and customer_phone are required" in data
+    assert "object has no attribute" not in data and "invalid literal" not in data
+
+
+def test_failed_batch_is_rejected_not_a_500(app, owner_client, monkeypatch):
+    from sqlalchemy.exc import IntegrityError
+
+    def conflict(*args):
+        raise IntegrityError("INSERT", {}, Exception("ex_bookings_no_overlap"))
+
+    monkeypatch.setattr("bulk.adjust_counter", conflict)
+    content = f"service,booking_date,booking_time,customer_name,customer_phone\nCut,{DAY},10:00,Customer,5550000000\n"
+    response = upload(owner_client, content.encode(), "bookings.csv")
+    assert response.status_code == 200
+    assert b"Imported 0 bookings, 1 rejected" in response.data and b"import it again" in response.data
+    assert booking_count(app) == 0
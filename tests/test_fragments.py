@@ -0,0 +1,31 @@
+from datetime import date, time, timedelta
+
+from conftest import login, make_business, make_user
+
+
+def test_bookings_keep_catalog_fragments(app, client):
+    from extensions import db
+    from fragments import fragment_cache
+    from models import Booking, Service
+    with app.app_context():
+        business = make_business(make_user("owner@example.com"))
+        business_id, service_id = business.id, Service.query.one().id
+    login(client, "owner@example.com")
+    for url in ("/dashboard/services", "/dashboard/hours"):
+        assert client.get(url).status_code == 200
+    rendered = fragment_cache.misses
+
+    with app.app_context():
+        db.session.add(Booking(business_id=business_id, service_id=service_id, customer_name="Customer",
+                               customer_phone="5550000000", booking_date=date.today() + timedelta(days=1),
+                               booking_time=time(10, 0)))
+        db.session.commit()
+    for url in ("/dashboard/services", "/dashboard/hours"):
+        assert client.get(url).status_code == 200
+    assert fragment_cache.misses == rendered
+
+    with app.app_context():
+        db.session.get(Service, service_id).name = "Trim"
+        db.session.commit()
+    response = client.get("/dashboard/services")
+    assert b"Trim" in response.data and fragment_cache.misses == rendered + 1
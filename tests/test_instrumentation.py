@@ -0,0 +1,23 @@
+from instrumentation import metrics
+
+
+def test_metrics_hidden_without_token(client):
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_require_token(app, client):
+    app.config["METRICS_TOKEN"] = "secret"
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200 and b"melsconnect_request_duration_seconds" in response.data
+
+
+def test_failed_requests_are_counted(app, client):
+    def boom():
+        raise RuntimeError("boom")
+    app.add_url_rule("/boom", "boom", boom)
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    before = metrics.snapshot().get("boom", (0,))[0]
+    assert client.get("/boom").status_code == 500
+    assert metrics.snapshot()["boom"][0] == before + 1
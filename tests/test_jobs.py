@@ -0,0 +1,39 @@
+def test_jobs_finish_one_at_a_time(app, monkeypatch):
+    import jobs
+    from extensions import db
+    from models import Job
+    seen = []
+
+    def record(payload):
+        # the job before this one is already done, in its own transaction
+        seen.append({job.id: job.status for job in Job.query.filter_by(kind="test.record").order_by(Job.id)})
+        if payload["n"] == 2:
+            raise RuntimeError("boom")
+
+    monkeypatch.setitem(jobs.HANDLERS, "test.record", record)
+    with app.app_context():
+        for n in range(3):
+            jobs.enqueue("test.record", {"n": n})
+        db.session.commit()
+        jobs.run_batch("worker")
+        first, second, third = (job.id for job in Job.query.filter_by(kind="test.record").order_by(Job.id))
+        assert seen[1][first] == "done" and seen[2][second] == "done"
+        assert [job.status for job in Job.query.filter_by(kind="test.record").order_by(Job.id)] == ["done", "done", "queued"]
+
+
+def test_reclaimed_job_is_skipped(app, monkeypatch):
+    import jobs
+    from extensions import db
+    from models import Job
+    ran = []
+    monkeypatch.setitem(jobs.HANDLERS, "test.record", lambda payload: ran.append(payload["n"]))
+    with app.app_context():
+        jobs.enqueue("test.record", {"n": 1})
+        db.session.commit()
+        claimed = jobs.claim_jobs("worker")
+        # another worker took it over after the lock timed out
+        Job.query.filter_by(kind="test.record").update({"locked_by": "other"})
+        db.session.commit()
+        monkeypatch.setattr(jobs, "claim_jobs", lambda worker_id, batch_size: claimed)
+        jobs.run_batch("worker")
+        assert ran == [] and Job.query.filter_by(kind="test.record").one().status == "running"
@@ -0,0 +1,61 @@
+from datetime import date, time, timedelta
+
+import pytest
+
+from conftest import login, make_business, make_user
+from querycount import LISTING_QUERY_LIMITS, assert_max_queries
+
+BOOKINGS = 30
+
+
+@pytest.fixture
+def seeded(app):
+    from extensions import db
+    from models import Booking, Service
+    with app.app_context():
+        make_user("admin@example.com", is_admin=True)
+        businesses = [make_business(make_user(f"owner{n}@example.com"),
+                                    services=[("Cut", 20, 30), ("Colour", 60, 90), ("Shave", 15, 15)])
+                      for n in range(3)]
+        services = {business.id: Service.query.filter_by(business_id=business.id).all() for business in businesses}
+        # interleaved, so every page of the admin listing spans several businesses and services
+        for i in range(BOOKINGS * len(businesses)):
+            business = businesses[i % len(businesses)]
+            db.session.add(Booking(business_id=business.id, service_id=services[business.id][i // 3 % 3].id,
+                                   customer_name=f"Customer {i}", customer_phone="5550000000",
+                                   booking_date=date.today() + timedelta(days=1 + i // 24),
+                                   booking_time=time(9 + i // 3 % 8, 0), status="confirmed" if i % 2 else "pending"))
+        db.session.commit()
+        slugs = [business.slug for business in businesses]
+    return slugs
+
+
+def test_public_page_query_limit(client, seeded):
+    url = f"/b/{seeded[0]}/"
+    assert_max_queries(client, url, LISTING_QUERY_LIMITS["/b/<slug>/"])
+    # served from the tenant snapshot once it is warm
+    assert_max_queries(client, url, LISTING_QUERY_LIMITS["/b/<slug>/ (warm)"])
+
+
+@pytest.mark.parametrize("url", ["/dashboard/", "/dashboard/bookings"])
+def test_owner_listing_query_limits(client, seeded, url):
+    login(client, "owner0@example.com")
+    assert_max_queries(client, url)
+
+
+@pytest.mark.parametrize("url", ["/admin/", "/admin/users", "/admin/businesses", "/admin/bookings"])
+def test_admin_listing_query_limits(client, seeded, url):
+    login(client, "admin@example.com")
+    assert_max_queries(client, url)
+
+
+def test_limits_do_not_grow_with_rows(app, client, seeded):
+    # a second page of the same size must cost no more than the first
+    from querycount import count_queries
+    login(client, "admin@example.com")
+    with count_queries(app) as first:
+        response = client.get("/admin/bookings")
+    cursor = response.get_data(as_text=True).split("after=", 1)[1].split('"', 1)[0]
+    with count_queries(app) as second:
+        assert client.get(f"/admin/bookings?after={cursor}").status_code == 200
+    assert second.count <= first.count
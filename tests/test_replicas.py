@@ -0,0 +1,38 @@
+import io
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import make_app, make_business, make_user, login
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    from extensions import db
+    app = make_app(f"sqlite:///{tmp_path / 'primary.db'}",
+                   SQLALCHEMY_BINDS={"replica": f"sqlite:///{tmp_path / 'replica.db'}"})
+    yield app
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def test_import_moves_the_owner_to_the_primary(replica_app):
+    from extensions import db
+    from replicas import PRIMARY_UNTIL_KEY, REPLICA_BIND, copy_sqlite_database
+    with replica_app.app_context():
+        make_business(make_user("owner@example.com"))
+        copy_sqlite_database(db.engines[None], db.engines[REPLICA_BIND])
+    client = replica_app.test_client()
+    login(client, "owner@example.com")
+    with client.session_transaction() as session:
+        assert PRIMARY_UNTIL_KEY not in session
+
+    # the replica never sees the import; only a primary read shows it
+    booking_date = (date.today() + timedelta(days=3)).isoformat()
+    upload = ("service,booking_date,booking_time,customer_name,customer_phone\n"
+              f"Cut,{booking_date},10:00,Imported Customer,5550000000\n")
+    response = client.post("/dashboard/bookings/import", data={"file": (io.BytesIO(upload.encode()), "bookings.csv")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 200 and b"Imported 1 bookings" in response.data
+    assert b"Imported Customer" in client.get("/dashboard/bookings").data
@@ -0,0 +1,71 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import make_user
+from querycount import count_queries
+
+THREADS = 4
+DUPLICATES = 1000
+
+
+def create(name, owner_id):
+    from models import Business
+    business = Business(name=name, owner_id=owner_id)
+    business.insert_with_unique_slug()
+    return business.slug
+
+
+def test_takes_the_first_free_suffix(app):
+    from extensions import db
+    from models import Business
+    with app.app_context():
+        owner_id = make_user("owner@example.com").id
+        # a name ending in a number is not a suffix this method handed out
+        assert create("Studio 54", owner_id) == "studio-54"
+        assert [create("Studio", owner_id) for _ in range(3)] == ["studio", "studio-1", "studio-2"]
+
+        db.session.delete(Business.query.filter_by(slug="studio-1").one())
+        db.session.commit()
+        assert create("Studio", owner_id) == "studio-1"
+        assert create("Studio", owner_id) == "studio-3"
+
+
+def test_long_numeric_names_do_not_break_the_base(app):
+    with app.app_context():
+        owner_id = make_user("owner@example.com").id
+        assert create("Hair Salon 5551234567", owner_id) == "hair-salon-5551234567"
+        assert create("Hair Salon 05", owner_id) == "hair-salon-05"
+        assert [create("Hair Salon", owner_id) for _ in range(2)] == ["hair-salon", "hair-salon-1"]
+
+
+def test_one_query_with_many_duplicate_names(app):
+    from extensions import db
+    from models import Business
+    with app.app_context():
+        owner_id = make_user("owner@example.com").id
+        slugs = ["hair-salon"] + [f"hair-salon-{n}" for n in range(1, DUPLICATES)]
+        db.session.execute(Business.__table__.insert(), [
+            {"name": "Hair Salon", "slug": slug, "owner_id": owner_id} for slug in slugs
+        ])
+        db.session.commit()
+        business = Business(name="Hair Salon", owner_id=owner_id)
+        with count_queries(app) as counter:
+            business.generate_slug()
+    assert counter.count == 1, "\n".join(counter.statements)
+    assert business.slug == f"hair-salon-{DUPLICATES}"
+
+
+def test_concurrent_creations_get_distinct_slugs(race_app):
+    name = f"Race Studio {os.urandom(4).hex()}"
+    with race_app.app_context():
+        owner_id = make_user(f"{name.replace(' ', '-').lower()}@example.com").id
+
+    def create_in_context(_):
+        with race_app.app_context():
+            return create(name, owner_id)
+
+    # every round has a winner, so no creation exhausts SLUG_ATTEMPTS
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        slugs = list(pool.map(create_in_context, range(THREADS)))
+    base = min(slugs, key=len)
+    assert sorted(slugs) == [base] + [f"{base}-{n}" for n in range(1, THREADS)]
@@ -0,0 +1,75 @@
+from datetime import date, datetime, time, timedelta
+
+from conftest import make_business, make_user
+
+
+def test_bookings_keep_the_tenant_snapshot(app, client):
+    from extensions import db
+    from models import Business, Service
+    from tenants import load_tenant, tenant_cache
+    with app.app_context():
+        business = make_business(make_user("owner@example.com"))
+        slug, service_id = business.slug, Service.query.one().id
+    assert client.get(f"/b/{slug}/").status_code == 200
+    misses = tenant_cache.misses
+
+    response = client.post(f"/b/{slug}/book", data={
+        "service_id": service_id, "booking_date": (date.today() + timedelta(days=2)).isoformat(),
+        "booking_time": "10:00", "customer_name": "Customer", "customer_phone": "5550000000",
+    })
+    assert response.status_code == 302
+    with app.app_context():
+        tenant = load_tenant(slug, revalidate=True)
+        row = db.session.get(Business, tenant.id)
+        # validators follow the booking, the snapshot itself is reused
+        assert tenant.version == row.version and tenant.catalog_version == row.catalog_version
+    assert tenant_cache.misses == misses
+
+    with app.app_context():
+        service = db.session.get(Service, service_id)
+        service.name = "Trim"
+        db.session.commit()
+        assert load_tenant(slug, revalidate=True).services[0].name == "Trim"
+    assert tenant_cache.misses == misses + 1
+
+
+def test_public_page_etag_ignores_bookings(app, client):
+    from extensions import db
+    from models import Booking, Service
+    with app.app_context():
+        business = make_business(make_user("owner@example.com"))
+        slug = business.slug
+        service = Service.query.one()
+        etag = client.get(f"/b/{slug}/").headers["ETag"]
+        db.session.add(Booking(business_id=business.id, service_id=service.id, customer_name="Customer",
+                               customer_phone="5550000000", booking_date=date.today() + timedelta(days=1),
+                               booking_time=time(10, 0)))
+        db.session.commit()
+    assert client.get(f"/b/{slug}/", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_last_modified_follows_catalog_and_bookings(app, client):
+    from extensions import db
+    from models import Booking, Business, Service
+    day = date.today() + timedelta(days=2)
+    with app.app_context():
+        business = make_business(make_user("owner@example.com"))
+        slug, business_id = business.slug, business.id
+        service_id = Service.query.one().id
+        # back-date the stamps so the booking below lands in a later second
+        an_hour_ago = datetime.utcnow() - timedelta(hours=1)
+        db.session.execute(Business.__table__.update().values(updated_at=an_hour_ago, catalog_updated_at=an_hour_ago))
+        db.session.commit()
+    page = client.get(f"/b/{slug}/")
+    slots_url = f"/b/{slug}/slots?service_id={service_id}&date={day.isoformat()}"
+    slots = client.get(slots_url)
+    assert page.last_modified and slots.last_modified
+
+    with app.app_context():
+        db.session.add(Booking(business_id=business_id, service_id=service_id, customer_name="Customer",
+                               customer_phone="5550000000", booking_date=day, booking_time=time(10, 0)))
+        db.session.commit()
+    since = {"If-Modified-Since": page.headers["Last-Modified"]}
+    assert client.get(f"/b/{slug}/", headers=since).status_code == 304
+    fresh = client.get(slots_url, headers={"If-Modified-Since": slots.headers["Last-Modified"]})
+    assert fresh.status_code == 200 and fresh.last_modified > slots.last_modified
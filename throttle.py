@@ -0,0 +1,53 @@
+import threading
+import time
+from flask import current_app
+from cache import MemoryBackend
+
+THROTTLE_MAX_KEYS = 100000
+
+
+class AttemptLimiter:
+    # Fixed-window attempt counters. They live in each worker process, so a
+    # client spread across N workers gets at most N times the limit.
+
+    def __init__(self, name, config_key, limit, window_seconds):
+        self.name = name
+        self.config_key = config_key
+        self.default_limit = limit
+        self.window_seconds = window_seconds
+        self.backend = MemoryBackend(max_entries=THROTTLE_MAX_KEYS, ttl=window_seconds)
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return current_app.config.get(self.config_key, self.default_limit)
+
+    def _key(self, key):
+        return (self.name, key, int(time.time() // self.window_seconds))
+
+    def blocked(self, key):
+        return bool(self.limit) and (self.backend.get(self._key(key)) or 0) >= self.limit
+
+    def hit(self, key):
+        # the backend locks get and set separately, so concurrent hits would lose counts
+        full_key = self._key(key)
+        with self._lock:
+            count = (self.backend.get(full_key) or 0) + 1
+            self.backend.set(full_key, count)
+        return count
+
+    def reset(self, key):
+        self.backend.delete(self._key(key))
+
+
+# failed logins and sign-ups, each per client address and per account
+login_ip_limiter = AttemptLimiter("login_ip", "LOGIN_ATTEMPTS_PER_IP", 20, 900)
+login_email_limiter = AttemptLimiter("login_email", "LOGIN_ATTEMPTS_PER_EMAIL", 5, 900)
+register_ip_limiter = AttemptLimiter("register_ip", "REGISTER_ATTEMPTS_PER_IP", 20, 3600)
+register_email_limiter = AttemptLimiter("register_email", "REGISTER_ATTEMPTS_PER_EMAIL", 5, 3600)
+LIMITERS = (login_ip_limiter, login_email_limiter, register_ip_limiter, register_email_limiter)
+
+
+def init_app(app):
+    for limiter in LIMITERS:
+        app.config.setdefault(limiter.config_key, limiter.default_limit)